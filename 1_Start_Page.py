@@ -1,6 +1,13 @@
 import streamlit as st
 
+from dashboard.metrics import begin_page, end_page, stage
+from dashboard.warmup import start_warmup
+
 st.set_page_config(page_title="Colorectal Cancer Dashboard", layout="wide")
+begin_page("Start Page")
+
+with stage("start warm-up"):
+    start_warmup()
 
 st.sidebar.image("./assets/Colorectal Cancer Logo.png")
 st.sidebar.success("Select a Tab Above")
@@ -115,4 +122,4 @@ with top_row[3]:
 
 st.markdown("<br>", unsafe_allow_html=True)
 
-
+end_page()
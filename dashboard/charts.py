@@ -0,0 +1,148 @@
+"""Chart builders that keep the browser payload bounded.
+
+``pca_scatter`` draws the clustering page's PCA projection at a level of
+detail chosen from how many patients fall inside the visible window:
+
+* ``"full"``     every point, only allowed once the window holds at most
+  ``full_limit`` points (i.e. after zooming in on a large cohort);
+* ``"sample"``   a stratified sample of ``budget`` points, allocated to
+  clusters in proportion to their size;
+* ``"density"``  per-cluster 2D bins drawn as one marker per non-empty bin,
+  sized by the number of patients in it.
+
+``"auto"`` picks full resolution up to ``budget`` points, sampling up to
+``density_threshold`` and density bins beyond.
+
+``heatmap`` draws annotated matrices (correlations, survival per cluster) as
+native Plotly heatmaps, so no matplotlib figure is created per rerun,
+``shap_waterfall`` draws a per-patient explanation from its values and
+``shap_summary`` the SHAP values of a sample of patients.
+"""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+LOD_MODES = ("auto", "full", "sample", "density")
+
+
+def stratified_sample(labels, budget, random_state=42):
+    """Sorted indices of at most ``budget`` rows, stratified by label.
+
+    Every non-empty label keeps at least one row. The generator is seeded so
+    reruns show the same points.
+    """
+    n = len(labels)
+    if n <= budget:
+        return np.arange(n)
+    rng = np.random.default_rng(random_state)
+    order = np.argsort(labels, kind="stable")
+    sizes = np.bincount(labels)
+    quota = np.maximum(sizes * budget // n, (sizes > 0).astype(np.int64))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    picks = [order[start + rng.choice(size, q, replace=False)]
+             for start, size, q in zip(starts, sizes, quota) if q]
+    return np.sort(np.concatenate(picks))
+
+
+def binned_points(x, y, labels, n_bins, x_range, y_range):
+    """Per-label 2D histogram as a frame of bin centres and counts (non-empty bins only)."""
+    (x0, x1), (y0, y1) = x_range, y_range
+    ix = np.clip(((x - x0) / (x1 - x0) * n_bins).astype(np.intp), 0, n_bins - 1)
+    iy = np.clip(((y - y0) / (y1 - y0) * n_bins).astype(np.intp), 0, n_bins - 1)
+    n_labels = int(labels.max()) + 1 if len(labels) else 0
+    counts = np.bincount((labels.astype(np.intp) * n_bins + ix) * n_bins + iy,
+                         minlength=n_labels * n_bins * n_bins)
+    nonzero = np.flatnonzero(counts)
+    label, cell = np.divmod(nonzero, n_bins * n_bins)
+    bx, by = np.divmod(cell, n_bins)
+    return pd.DataFrame({
+        "PC1": x0 + (bx + 0.5) * (x1 - x0) / n_bins,
+        "PC2": y0 + (by + 0.5) * (y1 - y0) / n_bins,
+        "Cluster": label,
+        "Patients": counts[nonzero],
+    })
+
+
+def pca_scatter(pca, labels, mode="auto", budget=5000, density_threshold=100_000, full_limit=50_000,
+                n_bins=40, x_range=(-4, 4), y_range=(-4, 4),
+                title="Patient Clusters by Risk Factors (PCA 2D)"):
+    """Build the PCA scatter for the points inside ``x_range`` x ``y_range``.
+
+    Returns ``(figure, mode_used, points_in_window)``; ``mode_used`` differs
+    from ``mode`` when ``"auto"`` was resolved or full resolution was refused
+    because the window still holds more than ``full_limit`` points.
+    """
+    if mode not in LOD_MODES:
+        raise ValueError(f"mode must be one of {LOD_MODES}, got {mode!r}")
+    x, y = pca[:, 0], pca[:, 1]
+    inside = (x >= x_range[0]) & (x <= x_range[1]) & (y >= y_range[0]) & (y <= y_range[1])
+    x, y, labels = x[inside], y[inside], labels[inside]
+    n = len(labels)
+
+    if mode == "auto":
+        mode = "full" if n <= budget else "sample" if n <= density_threshold else "density"
+    elif mode == "full" and n > full_limit:
+        mode = "sample"
+
+    order = [str(c) for c in range(int(labels.max()) + 1)] if n else []
+    style = dict(title=title, category_orders={"Cluster": order},
+                 color_discrete_sequence=px.colors.qualitative.Set2)
+    if mode == "density":
+        bins = binned_points(x, y, labels, n_bins, x_range, y_range)
+        fig = px.scatter(bins, x="PC1", y="PC2", color=bins["Cluster"].astype(str), size="Patients",
+                         size_max=14, hover_data={"Patients": True}, **style)
+    else:
+        keep = stratified_sample(labels, budget) if mode == "sample" else np.arange(n)
+        points = pd.DataFrame({"PC1": x[keep], "PC2": y[keep], "Cluster": labels[keep]})
+        fig = px.scatter(points, x="PC1", y="PC2", color=points["Cluster"].astype(str), **style)
+
+    fig.update_layout(
+        xaxis=dict(range=list(x_range)),
+        yaxis=dict(range=list(y_range)),
+        legend_title_text="Cluster"
+    )
+    return fig, mode, n
+
+
+def heatmap(matrix, title, colorscale="RdBu_r", fmt=".2f", zmin=None, zmax=None):
+    """Annotated heatmap of a DataFrame, rows top to bottom as in the table."""
+    fig = px.imshow(matrix, text_auto=fmt, color_continuous_scale=colorscale,
+                    zmin=zmin, zmax=zmax, aspect="auto", title=title)
+    fig.update_xaxes(title_text=matrix.columns.name or "", side="bottom")
+    fig.update_yaxes(title_text=matrix.index.name or "")
+    return fig
+
+
+def shap_waterfall(explanation, title="Why this prediction?"):
+    """Waterfall from the average prediction to this patient's, one step per feature."""
+    frame = explanation.frame().iloc[::-1]
+    labels = [f"{f} = {v}" for f, v in zip(frame["Feature"], frame["Value"])]
+    fig = go.Figure(go.Waterfall(
+        orientation="h",
+        base=explanation.base_value,
+        y=labels + ["Prediction"],
+        x=frame["SHAP"].tolist() + [0],
+        measure=["relative"] * len(frame) + ["total"],
+        text=[f"{v:+.3f}" for v in frame["SHAP"]] + [f"{explanation.prediction:.3f}"],
+        increasing=dict(marker=dict(color="#2E8B57")),
+        decreasing=dict(marker=dict(color="#C0392B")),
+        totals=dict(marker=dict(color="#1261B5")),
+    ))
+    fig.update_layout(title=title, xaxis_title="Probability of surviving 5 years",
+                      yaxis=dict(type="category"), showlegend=False)
+    fig.add_vline(x=explanation.base_value, line_dash="dot",
+                  annotation_text=f"average {explanation.base_value:.2f}")
+    return fig
+
+
+def shap_summary(values, title="SHAP values across patients"):
+    """One point per patient and feature, features ordered by mean absolute SHAP value."""
+    order = values.groupby("Feature")["SHAP"].apply(lambda v: v.abs().mean()).sort_values(ascending=False)
+    fig = px.strip(values, x="SHAP", y="Feature", hover_data=["Value"],
+                   category_orders={"Feature": list(order.index)})
+    fig.update_traces(marker=dict(size=4, opacity=0.6))
+    fig.update_layout(title=title, xaxis_title="Effect on the probability of surviving 5 years",
+                      yaxis_title="", showlegend=False)
+    fig.add_vline(x=0, line_dash="dot")
+    return fig
@@ -0,0 +1,439 @@
+"""Memoized patient clustering for the Diagnostic Analytics page.
+
+The clustering view only depends on the selected feature set, the number of
+clusters and the dataset version, yet it used to rebuild the preprocessing
+pipeline, refit KMeans and refit PCA on every rerun. ``ClusteringService``
+keeps, per feature set, the fitted ``ColumnTransformer``, the transformed
+matrix and its 2D PCA projection, and per (features, k, mode) the fitted
+model, labels, cluster profile and survival table. Entries are evicted least
+recently used first once the entry count or the byte budget is exceeded.
+
+In ``"minibatch"`` mode a fit is warm-started from a cached neighbouring
+``n_clusters`` solution of the same feature set, so stepping the slider from
+3 to 4 clusters only runs a few mini-batch iterations.
+
+Results are also written to ``CACHE_DIR`` (one joblib file per configuration
+and dataset version), and the start-up hook (``dashboard.warmup``) fits the
+likely configurations in a process pool right after the app starts, so the
+first click on the clustering tab is usually a disk or memory hit. To fill the cache ahead of a
+deploy run::
+
+    python -m dashboard.clustering
+
+When delta files add patients, a cached result of an earlier dataset version
+is extended instead of refitted: the new rows go through the fitted
+preprocessing and PCA and are assigned to the nearest existing centroid
+with ``predict``, and only the profile and survival tables are recomputed.
+"""
+import argparse
+import copy
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import streamlit as st
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.compose import ColumnTransformer
+from sklearn.decomposition import PCA
+from sklearn.metrics import pairwise_distances_argmin_min
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from dashboard import data, metrics
+from dashboard.files import write_atomic
+
+logger = logging.getLogger(__name__)
+
+MODES = ("full", "minibatch")
+
+# Bump when the shape of persisted results changes so stale files are ignored.
+CACHE_FORMAT = 3
+
+CACHE_DIR = os.environ.get("DASHBOARD_CLUSTER_CACHE", os.path.join(data.ROOT_DIR, ".cache", "clustering"))
+
+AVAILABLE_FEATURES = [
+    'Age', 'Cancer_Stage', 'Tumor_Size_mm', 'Family_History', 'Smoking_History',
+    'Alcohol_Consumption', 'Obesity_BMI', 'Diet_Risk', 'Physical_Activity',
+    'Diabetes', 'Genetic_Mutation', 'Screening_History', 'Early_Detection', 'Treatment_Type'
+]
+
+DEFAULT_FEATURES = ['Age', 'Cancer_Stage', 'Tumor_Size_mm', 'Smoking_History']
+
+# Feature sets fitted in the background at startup: the page default, the
+# notebook's full risk-factor set and a few common narrower selections.
+WARMUP_FEATURE_SETS = [
+    DEFAULT_FEATURES,
+    AVAILABLE_FEATURES,
+    ['Age', 'Tumor_Size_mm'],
+    ['Age', 'Cancer_Stage', 'Tumor_Size_mm'],
+    ['Age', 'Smoking_History', 'Alcohol_Consumption', 'Obesity_BMI', 'Diet_Risk', 'Physical_Activity'],
+]
+
+WARMUP_CLUSTERS = range(2, 7)
+
+
+def _nbytes(obj):
+    if sp.issparse(obj):
+        return obj.data.nbytes + obj.indices.nbytes + obj.indptr.nbytes
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    return 0
+
+
+class FeatureSpace:
+    """Preprocessed matrix and PCA projection for one feature set."""
+
+    def __init__(self, df, features):
+        self.features = list(features)
+        self.num_cols = [c for c in self.features if pd.api.types.is_numeric_dtype(df[c])]
+        self.cat_cols = [c for c in self.features if c not in self.num_cols]
+        self.rows = df[self.features].notna().all(axis=1).to_numpy()
+        frame = df.loc[self.rows, self.features]
+
+        self.prep = ColumnTransformer([
+            ('num', StandardScaler(), self.num_cols),
+            ('cat', OneHotEncoder(drop='first'), self.cat_cols)
+        ])
+        self.X = self.prep.fit_transform(frame)
+        self.projection = PCA(n_components=2)
+        self.pca = self.projection.fit_transform(self.X).astype(np.float32)
+
+    def extended(self, df):
+        """This space with the rows of ``df`` appended, and their transformed matrix.
+
+        The new rows go through the already fitted preprocessing and PCA.
+        Raises ``ValueError`` for a category the encoder has not seen.
+        """
+        rows = df[self.features].notna().all(axis=1).to_numpy()
+        X = self.prep.transform(df.loc[rows, self.features])
+        space = copy.copy(self)
+        space.rows = np.concatenate([self.rows, rows])
+        space.pca = np.vstack([self.pca, self.projection.transform(X).astype(np.float32)])
+        if self.X is not None:
+            space.X = sp.vstack([self.X, X]).tocsr() if sp.issparse(self.X) else np.vstack([self.X, X])
+        return space, X
+
+    @property
+    def nbytes(self):
+        return _nbytes(self.X) + self.pca.nbytes + self.rows.nbytes
+
+    def __getstate__(self):
+        # The transformed matrix can be rebuilt and dominates the size on
+        # disk; persisted results only need the projection and row mask.
+        return {**self.__dict__, "X": None}
+
+
+class ClusteringResult:
+    """Fitted model, labels and summaries for one (features, n_clusters, mode)."""
+
+    def __init__(self, space, model, labels, profile, survival):
+        self.space = space
+        self.model = model
+        self.labels = labels
+        self.profile = profile
+        self.survival = survival
+
+    @property
+    def n_clusters(self):
+        return self.model.n_clusters
+
+    def extended(self, df, start):
+        """Result for ``df``, whose first ``start`` rows are the ones this result was computed on.
+
+        The remaining rows are assigned to the existing clusters.
+        """
+        space, X = self.space.extended(df.iloc[start:])
+        labels = np.concatenate([self.labels, self.model.predict(X).astype(np.int8)]) if X.shape[0] else self.labels
+        return ClusteringResult(space, self.model, labels,
+                                cluster_profile(df, space, labels, self.n_clusters),
+                                survival_table(df, space, labels))
+
+    @property
+    def nbytes(self):
+        fitted_labels = getattr(self.model, "labels_", None)
+        return (self.labels.nbytes + _nbytes(fitted_labels) + self.model.cluster_centers_.nbytes
+                + _nbytes(self.profile) + _nbytes(self.survival))
+
+
+def cluster_profile(df, space, labels, n_clusters):
+    """Per-cluster mean of numeric and most frequent level of categorical features.
+
+    Computed in one vectorized pass per feature: ``bincount`` over the labels
+    for means, and over (label, category code) pairs for modes, so the cost
+    is linear in rows with no Python-level work per group. Ties between
+    levels go to the first in category order. Adds each cluster's patient
+    count and share of the clustered patients.
+    """
+    sizes = np.bincount(labels, minlength=n_clusters)
+    profile = {}
+    for col in space.features:
+        values = df[col].to_numpy()[space.rows] if col in space.num_cols else df[col][space.rows]
+        if col in space.num_cols:
+            sums = np.bincount(labels, weights=values.astype(np.float64), minlength=n_clusters)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                profile[col] = sums / sizes
+        else:
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype("category")
+            categories = values.cat.categories
+            codes = values.cat.codes.to_numpy().astype(np.intp)
+            table = np.bincount(labels.astype(np.intp) * len(categories) + codes,
+                                minlength=n_clusters * len(categories)).reshape(n_clusters, len(categories))
+            profile[col] = np.asarray(categories)[table.argmax(axis=1)]
+    profile["Patients"] = sizes
+    profile["Share (%)"] = 100 * sizes / max(sizes.sum(), 1)
+    return pd.DataFrame(profile, index=pd.RangeIndex(n_clusters, name='Cluster'))
+
+
+def survival_table(df, space, labels):
+    """Percentage of each 5-year survival outcome per cluster."""
+    if 'Survival_5_years' not in df.columns:
+        return None
+    outcome = df.loc[space.rows, 'Survival_5_years']
+    return pd.crosstab(pd.Series(labels, index=outcome.index, name='Cluster'), outcome, normalize='index') * 100
+
+
+def _warm_start(space, neighbour, n_clusters, random_state=42, sample_size=10_000):
+    """Initial centers for ``n_clusters`` derived from a neighbouring solution."""
+    centers = neighbour.model.cluster_centers_
+    if len(centers) > n_clusters:
+        sizes = np.bincount(neighbour.labels, minlength=len(centers))
+        return np.delete(centers, np.argsort(sizes)[:len(centers) - n_clusters], axis=0)
+    rng = np.random.default_rng(random_state)
+    X = space.X
+    idx = rng.choice(X.shape[0], size=min(sample_size, X.shape[0]), replace=False)
+    sample = X[idx]
+    while len(centers) < n_clusters:
+        _, dist = pairwise_distances_argmin_min(sample, centers)
+        far = sample[int(np.argmax(dist))]
+        centers = np.vstack([centers, far.toarray() if sp.issparse(far) else far])
+    return centers
+
+
+def result_path(cache_dir, features, n_clusters, mode, version):
+    """File holding the persisted result of one configuration."""
+    digest = hashlib.sha1("|".join(features).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"v{CACHE_FORMAT}-{version}", f"{digest}-k{n_clusters}-{mode}.joblib")
+
+
+class ClusteringService:
+    """Thread-safe LRU memo of feature spaces and clustering results.
+
+    With a ``cache_dir`` every computed result is also persisted there and a
+    memory miss is looked up on disk before fitting.
+    """
+
+    def __init__(self, max_entries=32, max_bytes=512 * 1024 ** 2, cache_dir=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def _put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries or (
+                    len(self._entries) > 1 and self.nbytes > self.max_bytes):
+                self._entries.popitem(last=False)
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return sum(v.nbytes for v in self._entries.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def feature_space(self, df, features, version):
+        key = ("space", tuple(features), version)
+        space = self._get(key)
+        if space is None:
+            with metrics.stage("feature space (PCA)"):
+                space = FeatureSpace(df, features)
+            self._put(key, space)
+        return space
+
+    def _load(self, features, n_clusters, mode, version):
+        if self.cache_dir is None:
+            return None
+        path = result_path(self.cache_dir, features, n_clusters, mode, version)
+        if not os.path.exists(path):
+            return None
+        try:
+            return joblib.load(path)
+        except Exception:  # unreadable or from an incompatible version: refit
+            return None
+
+    def _persist(self, result, features, n_clusters, mode, version):
+        if self.cache_dir is None:
+            return
+        path = result_path(self.cache_dir, features, n_clusters, mode, version)
+        try:
+            write_atomic(path, lambda tmp: joblib.dump(result, tmp))
+        except OSError as e:  # the result is still served from memory
+            logger.warning("could not write %s: %s", path, e)
+
+    def _neighbour(self, features, n_clusters, version, mode):
+        for distance in (1, 2, 3, 4):
+            for k in (n_clusters - distance, n_clusters + distance):
+                hit = self._get(("fit", tuple(features), k, mode, version))
+                if hit is not None and k >= 1:
+                    return hit
+        return None
+
+    def _extend(self, df, features, n_clusters, mode, previous):
+        for version, rows in reversed(previous):
+            result = self._get(("fit", tuple(features), n_clusters, mode, version))
+            if result is None:
+                result = self._load(features, n_clusters, mode, version)
+            if result is not None:
+                try:
+                    return result.extended(df, rows)
+                except ValueError:
+                    return None
+        return None
+
+    def cluster(self, df, features, n_clusters, version, mode="full", previous=()):
+        """Return the memoized ``ClusteringResult`` for this configuration.
+
+        ``version`` identifies the dataset contents (see
+        ``dashboard.data.dataset_version``) so results never outlive the data
+        they were computed from. ``previous`` lists earlier ``(version, rows)``
+        of the same dataset (``dashboard.data.version_history``); a result
+        cached for one of them is extended to the new rows instead of refitted.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+        key = ("fit", tuple(features), n_clusters, mode, version)
+        result = self._get(key)
+        outcome = "hit"
+        if result is None:
+            outcome = "disk"
+            result = self._load(features, n_clusters, mode, version)
+            if result is not None:
+                self._put(key, result)
+        if result is None and previous:
+            outcome = "update"
+            with metrics.stage("extend clusters"):
+                result = self._extend(df, features, n_clusters, mode, previous)
+            if result is not None:
+                self._put(key, result)
+                self._persist(result, features, n_clusters, mode, version)
+        if result is not None:
+            metrics.count("clustering", outcome)
+            return result
+        metrics.count("clustering", "miss")
+
+        space = self.feature_space(df, features, version)
+        if mode == "full":
+            model = KMeans(n_clusters=n_clusters, random_state=42, n_init='auto')
+        else:
+            neighbour = self._neighbour(features, n_clusters, version, mode)
+            if neighbour is None:
+                model = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init='auto')
+            else:
+                model = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=1,
+                                        init=_warm_start(space, neighbour, n_clusters))
+        with metrics.stage("kmeans fit"):
+            labels = model.fit_predict(space.X).astype(np.int8)
+        with metrics.stage("cluster profiles"):
+            result = ClusteringResult(space, model, labels,
+                                      cluster_profile(df, space, labels, n_clusters),
+                                      survival_table(df, space, labels))
+        self._put(key, result)
+        self._persist(result, features, n_clusters, mode, version)
+        return result
+
+
+@st.cache_resource
+def get_service():
+    """The process-wide clustering service shared by all sessions."""
+    return ClusteringService(cache_dir=CACHE_DIR)
+
+
+def _warm_feature_set(path, history, features, cluster_counts, mode, cache_dir):
+    # Runs in a worker process: one feature space, every requested k. The
+    # parent has built the columnar copy, so workers only map it.
+    df = data.open_dataset(path)
+    if len(df) != history[-1][1]:  # the data changed after the parent read it
+        return None
+    service = ClusteringService(cache_dir=cache_dir)
+    for n_clusters in cluster_counts:
+        service.cluster(df, features, n_clusters, history[-1][0], mode, previous=history[:-1])
+    return features
+
+
+def warm_up(feature_sets=WARMUP_FEATURE_SETS, cluster_counts=WARMUP_CLUSTERS, modes=("full",),
+            path=data.DATA_PATH, cache_dir=CACHE_DIR, max_workers=None):
+    """Fit and persist every (feature set, k, mode) not yet in ``cache_dir``.
+
+    Each feature set is one task in a process pool so its preprocessing and
+    PCA are computed once for all ``cluster_counts``. The dataset is loaded
+    here first; the workers only read its columnar copy. Returns the feature
+    sets that were fitted.
+    """
+    # Build (or load) the dataset once here, so the workers never write
+    # the columnar copy concurrently.
+    data.load_dataset(path)
+    history = data.version_history(path)
+    version = history[-1][0]
+    tasks = []
+    for features in feature_sets:
+        for mode in modes:
+            missing = [k for k in cluster_counts
+                       if not os.path.exists(result_path(cache_dir, features, k, mode, version))]
+            if missing:
+                tasks.append((list(features), missing, mode))
+    if not tasks:
+        return []
+
+    # Spawned workers avoid forking the threads of a running Streamlit server.
+    context = multiprocessing.get_context("spawn")
+    done = []
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        futures = [pool.submit(_warm_feature_set, path, history, f, ks, mode, cache_dir)
+                   for f, ks, mode in tasks]
+        for future in as_completed(futures):
+            if future.result() is not None:
+                done.append(future.result())
+    return done
+
+
+def warm_up_quietly(**kwargs):
+    """``warm_up`` for the background hook: errors are logged instead of raised."""
+    try:
+        warm_up(**kwargs)
+    except Exception as e:  # a failed warm-up must never take the app down
+        logger.warning("warm-up skipped: %s", e)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute clustering results for the Diagnostic page.")
+    parser.add_argument("--csv", default=data.DATA_PATH)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--minibatch", action="store_true", help="also warm the MiniBatchKMeans mode")
+    args = parser.parse_args()
+    # Go through the package module so pickled results and pool tasks refer
+    # to dashboard.clustering rather than __main__.
+    from dashboard.clustering import warm_up
+    fitted = warm_up(modes=MODES if args.minibatch else ("full",), path=args.csv, max_workers=args.workers)
+    print(f"Fitted {len(fitted)} feature set(s) into {CACHE_DIR}")
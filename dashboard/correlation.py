@@ -0,0 +1,129 @@
+"""Cached correlation matrices for the Diagnostic Analytics page.
+
+Picking features in the correlation multiselect used to re-rank every
+selected column and recompute the matrix. ``CorrelationEngine`` ranks each
+candidate column once per dataset version, computes the full pairwise matrix
+for a method the first time it is asked for, and answers any selection as a
+sub-matrix lookup. Spearman is Pearson over average ranks; Kendall's tau-b
+is computed per pair with SciPy.
+
+Pairs are evaluated over rows where both columns are present. With missing
+values Spearman ranks are taken over each column's own non-missing values,
+which can differ slightly from ``DataFrame.corr`` re-ranking every pair;
+the postprocessed dataset has no missing values.
+
+When a delta file arrives, ``CorrelationEngine.updated`` appends its rows
+and shifts the existing average ranks by the number of new values below
+(and tied with) each of them, instead of ranking the whole column again.
+The matrices are then recomputed from the updated ranks on first use.
+"""
+import copy
+import threading
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from dashboard import data
+
+CORRELATION_FEATURES = [
+    "Age", "Tumor_Size_mm", "Cancer_Stage_Encoded",
+    "Survival_Prediction_Encoded"
+]
+
+METHODS = ("spearman", "pearson", "kendall")
+
+
+def _pearson(X):
+    """Pairwise-complete Pearson correlation of the columns of ``X``."""
+    missing = np.isnan(X)
+    if not missing.any():
+        return np.corrcoef(X, rowvar=False)
+    p = X.shape[1]
+    out = np.eye(p)
+    for i, j in combinations(range(p), 2):
+        both = ~(missing[:, i] | missing[:, j])
+        out[i, j] = out[j, i] = np.corrcoef(X[both, i], X[both, j])[0, 1]
+    return out
+
+
+def _kendall(X):
+    from scipy.stats import kendalltau
+
+    p = X.shape[1]
+    out = np.eye(p)
+    for i, j in combinations(range(p), 2):
+        both = ~(np.isnan(X[:, i]) | np.isnan(X[:, j]))
+        out[i, j] = out[j, i] = kendalltau(X[both, i], X[both, j]).statistic
+    return out
+
+
+class CorrelationEngine:
+    """Full correlation matrices over ``features``, computed once per method."""
+
+    def __init__(self, df, features=CORRELATION_FEATURES):
+        self.features = list(features)
+        self.values = self._columns(df)
+        self.ranks = pd.DataFrame(self.values).rank(method="average").to_numpy()
+        self.sorted = [np.sort(v[~np.isnan(v)]) for v in self.values.T]
+        self._matrices = {}
+        self._lock = threading.Lock()
+
+    def _columns(self, df):
+        columns = []
+        for name in self.features:
+            values = df[name].to_numpy(dtype=np.float64)
+            if name.endswith("_Encoded"):
+                values = np.where(values == data.MISSING_CODE, np.nan, values)
+            columns.append(values)
+        return np.column_stack(columns)
+
+    def updated(self, delta):
+        """A new engine with the rows of ``delta`` appended and the ranks shifted to match."""
+        added = self._columns(delta)
+        ranks, merged = [], []
+        for j, column in enumerate(added.T):
+            new = np.sort(column[~np.isnan(column)])
+            old = self.values[:, j]
+            below = np.searchsorted(new, old, side="left")
+            tied = np.searchsorted(new, old, side="right") - below
+            values = np.sort(np.concatenate([self.sorted[j], new]), kind="stable")
+            lo = np.searchsorted(values, column, side="left")
+            hi = np.searchsorted(values, column, side="right")
+            own = np.where(np.isnan(column), np.nan, lo + (hi - lo + 1) / 2)
+            ranks.append(np.concatenate([self.ranks[:, j] + below + tied / 2, own]))
+            merged.append(values)
+        engine = copy.copy(self)
+        engine.values = np.vstack([self.values, added])
+        engine.ranks = np.column_stack(ranks)
+        engine.sorted = merged
+        engine._matrices = {}
+        engine._lock = threading.Lock()
+        return engine
+
+    def matrix(self, method="spearman"):
+        """The full ``features`` x ``features`` matrix for ``method``."""
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {METHODS}, got {method!r}")
+        with self._lock:
+            if method not in self._matrices:
+                if method == "spearman":
+                    m = _pearson(self.ranks)
+                elif method == "pearson":
+                    m = _pearson(self.values)
+                else:
+                    m = _kendall(self.values)
+                self._matrices[method] = pd.DataFrame(m, index=self.features, columns=self.features)
+            return self._matrices[method]
+
+    def corr(self, features, method="spearman"):
+        """Correlation sub-matrix for ``features``, in the given order."""
+        return self.matrix(method).loc[list(features), list(features)]
+
+
+_engines = data.DerivedCache("correlation", CorrelationEngine, lambda engine, delta: engine.updated(delta))
+
+
+def get_engine(path=data.DATA_PATH):
+    """Return the process-wide engine for the current version of the dataset."""
+    return _engines.get(path)
@@ -0,0 +1,90 @@
+"""Counterfactual recommendations for the Prescriptive page.
+
+Only four model inputs are lifestyle choices a patient can change; Age and
+Family_History are fixed. Those four take 3 x 2 x 3 x 3 = 54 combinations, so
+``recommend`` enumerates every one for the patient, scores them in a single
+``predict_proba`` call and keeps the smallest changes that raise the
+predicted probability of surviving five years. By default a feature may only
+move towards its healthier levels (``MODIFIABLE`` lists them from least to
+most healthy), so the engine never suggests, say, starting to drink.
+"""
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from dashboard.prediction import CATEGORY_LEVELS, MODEL_COLUMNS, predict_proba
+
+MODIFIABLE = {
+    "Diet_Risk": ["High", "Moderate", "Low"],
+    "Alcohol_Consumption": ["Yes", "No"],
+    "Screening_History": ["Never", "Irregular", "Regular"],
+    "Obesity_BMI": ["Obese", "Overweight", "Normal"],
+}
+
+
+def candidates(patient, healthy_only=True):
+    """Every variant of ``patient`` over the modifiable features, the unchanged one first.
+
+    ``patient`` is a Series (or one-row frame) of model inputs. Returns the
+    variants with ``Changes`` (features changed) and ``Steps`` (levels moved
+    in total) columns.
+    """
+    if isinstance(patient, pd.DataFrame):
+        patient = patient.iloc[0]
+    options = []
+    for feature, levels in MODIFIABLE.items():
+        current = str(patient[feature])
+        start = levels.index(current) if healthy_only and current in levels else 0
+        allowed = levels[start:]
+        options.append(sorted(allowed, key=lambda level: level != current))
+    grid = pd.DataFrame(list(product(*options)), columns=list(MODIFIABLE))
+    out = pd.DataFrame({c: np.repeat(patient[c], len(grid)) for c in MODEL_COLUMNS})
+    for feature, levels in MODIFIABLE.items():
+        out[feature] = pd.Categorical(grid[feature], categories=CATEGORY_LEVELS[feature])
+    steps = np.zeros(len(grid), dtype=int)
+    changes = np.zeros(len(grid), dtype=int)
+    for feature, levels in MODIFIABLE.items():
+        rank = {level: i for i, level in enumerate(levels)}
+        moved = grid[feature].map(rank).to_numpy() - rank.get(str(patient[feature]), 0)
+        steps += np.abs(moved)
+        changes += moved != 0
+    out["Changes"] = changes
+    out["Steps"] = steps
+    return out
+
+
+def describe(row, patient):
+    """Human-readable list of the changes ``row`` makes to ``patient``."""
+    return "; ".join(f"{f}: {patient[f]} → {row[f]}" for f in MODIFIABLE if str(row[f]) != str(patient[f]))
+
+
+def recommend(model, patient, healthy_only=True, max_results=5, min_gain=1e-9):
+    """The smallest changes that improve the predicted probability of surviving 5 years.
+
+    A candidate is dropped when a candidate with a subset of its changes
+    already reaches at least the same probability, so every recommendation
+    is minimal. Sorted by features changed, then probability. Returns the
+    baseline probability and the recommendations frame.
+    """
+    if isinstance(patient, pd.DataFrame):
+        patient = patient.iloc[0]
+    variants = candidates(patient, healthy_only)
+    proba = predict_proba(model, variants[MODEL_COLUMNS])
+    baseline = float(proba[0])
+    variants["Survival probability"] = proba
+    variants["Gain"] = proba - baseline
+
+    changed = variants[list(MODIFIABLE)].astype(str).to_numpy() != np.array([str(patient[f]) for f in MODIFIABLE])
+    better = np.flatnonzero(variants["Gain"].to_numpy() > min_gain)
+    keep = []
+    for i in better[np.lexsort((-proba[better], variants["Changes"].to_numpy()[better]))]:
+        dominated = any((changed[j] <= changed[i]).all() and proba[j] >= proba[i] for j in keep)
+        if not dominated:
+            keep.append(i)
+    result = variants.iloc[keep].copy()
+    result.insert(0, "Recommendation", [describe(row, patient) for _, row in result.iterrows()])
+    result["Predicted"] = np.where(result["Survival probability"] > 0.5, "Survive 5 years", "Not survive 5 years")
+    result["Flips prediction"] = (result["Survival probability"] > 0.5) != (baseline > 0.5)
+    columns = ["Recommendation", "Changes", "Steps", "Survival probability", "Gain", "Predicted", "Flips prediction"]
+    return baseline, result[columns].head(max_results).reset_index(drop=True)
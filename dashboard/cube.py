@@ -0,0 +1,292 @@
+"""Precomputed aggregates behind the Descriptive Analytics page.
+
+Every question on that page is a count or a Tumor_Size_mm summary over a few
+low-cardinality columns and an integer age range. ``DescriptiveCube`` bins the
+dataset once into a dense array indexed by (Age, Gender, Cancer_Stage,
+Smoking_History, Survival_5_years) holding row counts, Tumor_Size_mm sums and
+squared sums, and a per-cell Tumor_Size_mm histogram that serves as a quantile
+sketch. A widget change then slices and sums this array; its size depends on
+the number of distinct values, not on the number of patients.
+
+Each categorical axis has one extra trailing slot for missing values, so
+unfiltered totals match the raw rows while grouped results leave them out,
+as ``value_counts``/``groupby`` do.
+
+The age-range slider is served by ``AgeIndex``, per-gender prefix sums over
+age, so its histogram and descriptive statistics cost O(bins) per drag.
+
+The cube is additive, so new delta files are binned on their own and added
+to it (``DescriptiveCube.updated``); only rows with a level, age or tumour
+size outside its axes trigger a rebuild.
+"""
+import copy
+import math
+
+import numpy as np
+import pandas as pd
+
+from dashboard import data
+
+DIMENSIONS = ["Age", "Gender", "Cancer_Stage", "Smoking_History", "Survival_5_years"]
+VALUE = "Tumor_Size_mm"
+
+
+def _quantile(hist, centers, q):
+    """Linear-interpolated quantile (as ``Series.quantile``) from a histogram."""
+    n = int(hist.sum())
+    if n == 0:
+        return np.nan
+    cum = np.cumsum(hist)
+    h = (n - 1) * q
+    lo = math.floor(h)
+    v_lo = centers[np.searchsorted(cum, lo, side="right")]
+    v_hi = centers[np.searchsorted(cum, min(lo + 1, n - 1), side="right")]
+    return float(v_lo + (h - lo) * (v_hi - v_lo))
+
+
+def _summarize(hist, centers, n, total, total_sq):
+    """count/mean/std/min/quartiles/max from a histogram and its moments."""
+    mean = total / n if n else np.nan
+    std = math.sqrt(max(total_sq - total * mean, 0.0) / (n - 1)) if n > 1 else np.nan
+    nonzero = np.flatnonzero(hist)
+    return {
+        "count": n,
+        "mean": mean,
+        "std": std,
+        "min": float(centers[nonzero[0]]) if n else np.nan,
+        "25%": _quantile(hist, centers, 0.25),
+        "50%": _quantile(hist, centers, 0.5),
+        "75%": _quantile(hist, centers, 0.75),
+        "max": float(centers[nonzero[-1]]) if n else np.nan,
+    }
+
+
+class AgeIndex:
+    """Prefix sums over the integer age domain, one row per group.
+
+    Row ``g`` of the cumulative arrays holds, for each age boundary, the
+    number of patients of that group younger than it together with the sum
+    and squared sum of their ages. Any inclusive age range is then answered
+    by differencing two columns: counts, means and variances in O(1),
+    quartiles by binary search and ``n_bins`` histogram bins in O(n_bins).
+    """
+
+    def __init__(self, counts):
+        self.by = counts.index.name
+        self.groups = counts.index.tolist()
+        self.min_age = int(counts.columns[0])
+        self.max_age = int(counts.columns[-1])
+        ages = np.arange(self.min_age, self.max_age + 1, dtype=np.float64)
+        c = counts.reindex(columns=range(self.min_age, self.max_age + 1), fill_value=0).to_numpy(dtype=np.float64)
+        pad = np.zeros((len(self.groups), 1))
+        self._n = np.hstack([pad, np.cumsum(c, axis=1)])
+        self._s = np.hstack([pad, np.cumsum(c * ages, axis=1)])
+        self._ss = np.hstack([pad, np.cumsum(c * ages * ages, axis=1)])
+
+    def _bounds(self, age_range):
+        n_ages = self._n.shape[1] - 1
+        if age_range is None:
+            return 0, n_ages
+        lo = min(max(int(age_range[0]) - self.min_age, 0), n_ages)
+        hi = min(max(int(age_range[1]) - self.min_age + 1, lo), n_ages)
+        return lo, hi
+
+    def counts(self, age_range=None):
+        """Patients per group within ``age_range`` (inclusive)."""
+        lo, hi = self._bounds(age_range)
+        return pd.Series((self._n[:, hi] - self._n[:, lo]).astype(np.int64),
+                         index=pd.Index(self.groups, name=self.by), name="count")
+
+    def _age_at_rank(self, g, lo, rank):
+        return self.min_age + np.searchsorted(self._n[g], self._n[g, lo] + rank, side="right") - 1
+
+    def describe(self, age_range=None):
+        """Equivalent of ``groupby(by)["Age"].describe()`` for ``age_range``."""
+        lo, hi = self._bounds(age_range)
+        rows = {}
+        for g, group in enumerate(self.groups):
+            n = int(self._n[g, hi] - self._n[g, lo])
+            if not n:
+                continue
+            total = self._s[g, hi] - self._s[g, lo]
+            total_sq = self._ss[g, hi] - self._ss[g, lo]
+            mean = total / n
+            row = {
+                "count": n,
+                "mean": mean,
+                "std": math.sqrt(max(total_sq - total * mean, 0.0) / (n - 1)) if n > 1 else np.nan,
+            }
+            for label, q in (("min", 0.0), ("25%", 0.25), ("50%", 0.5), ("75%", 0.75), ("max", 1.0)):
+                h = (n - 1) * q
+                below = math.floor(h)
+                a = self._age_at_rank(g, lo, below)
+                b = self._age_at_rank(g, lo, min(below + 1, n - 1))
+                row[label] = float(a + (h - below) * (b - a))
+            rows[group] = row
+        return pd.DataFrame.from_dict(rows, orient="index").rename_axis(self.by)
+
+    def histogram(self, age_range=None, n_bins=20):
+        """Long-format counts per group for up to ``n_bins`` equal age bins."""
+        lo, hi = self._bounds(age_range)
+        width = max(math.ceil((hi - lo) / n_bins), 1)
+        edges = np.append(np.arange(lo, hi, width), hi)
+        counts = self._n[:, edges[1:]] - self._n[:, edges[:-1]]
+        starts = self.min_age + edges[:-1]
+        ends = self.min_age + edges[1:] - 1
+        return pd.DataFrame({
+            self.by: np.repeat(self.groups, len(starts)),
+            "Age": np.tile([f"{a}-{b}" if a != b else f"{a}" for a, b in zip(starts, ends)], len(self.groups)),
+            "Age_Start": np.tile(starts, len(self.groups)),
+            "count": counts.reshape(-1).astype(np.int64),
+        })
+
+
+class DescriptiveCube:
+    """Dense aggregate cube over ``DIMENSIONS`` with Tumor_Size_mm statistics."""
+
+    def __init__(self, df, max_bins=128):
+        age = df["Age"].to_numpy(dtype=float)
+        known_age = age[~np.isnan(age)]
+        self.min_age = int(known_age.min())
+        self.max_age = int(known_age.max())
+        self.levels = {"Age": list(range(self.min_age, self.max_age + 1))}
+        for dim in DIMENSIONS[1:]:
+            col = df[dim]
+            if not isinstance(col.dtype, pd.CategoricalDtype):
+                col = col.astype("category")
+            self.levels[dim] = col.cat.categories.tolist()
+        self.shape = tuple(len(self.levels[d]) + 1 for d in DIMENSIONS)
+
+        # Integer-valued sizes that fit in max_bins get one bin per value, which
+        # makes the sketch exact; otherwise fall back to equal-width bins.
+        values = df[VALUE].to_numpy(dtype=float)
+        values = values[~np.isnan(values)]
+        lo, hi = (values.min(), values.max()) if len(values) else (0.0, 0.0)
+        if np.all(values == np.round(values)) and hi - lo + 1 <= max_bins:
+            self.centers = np.arange(lo, hi + 1)
+            self.edges = None
+        else:
+            self.edges = np.linspace(lo, hi, max_bins + 1)
+            self.centers = (self.edges[:-1] + self.edges[1:]) / 2
+
+        self.count, self.value_count, self.value_sum, self.value_sumsq, self.value_hist = self._accumulate(df)
+        self.age_index = AgeIndex(self.counts(["Gender", "Age"]).unstack("Age", fill_value=0))
+
+    def _cells(self, df):
+        """Flat cell of each row of ``df``, or ``None`` if a row falls outside the axes."""
+        age = df["Age"].to_numpy(dtype=float)
+        known = ~np.isnan(age)
+        if known.any() and (age[known].min() < self.min_age or age[known].max() > self.max_age):
+            return None
+        codes = [np.where(known, age - self.min_age, self.shape[0] - 1).astype(np.intp)]
+        for dim in DIMENSIONS[1:]:
+            col = df[dim]
+            c = pd.Categorical(col, categories=self.levels[dim]).codes.astype(np.intp)
+            if ((c < 0) & col.notna().to_numpy()).any():
+                return None
+            c[c < 0] = len(self.levels[dim])
+            codes.append(c)
+        return np.ravel_multi_index(codes, self.shape)
+
+    def _bins(self, values):
+        """Histogram bin of each tumour size, or ``None`` if one falls outside the bins."""
+        if self.edges is None:
+            bins = values - self.centers[0]
+            if not np.all((bins == np.round(bins)) & (bins >= 0) & (bins < len(self.centers))):
+                return None
+            return bins.astype(np.intp)
+        if len(values) and (values.min() < self.edges[0] or values.max() > self.edges[-1]):
+            return None
+        return np.clip(np.searchsorted(self.edges, values, side="right") - 1, 0, len(self.centers) - 1)
+
+    def _accumulate(self, df):
+        flat = self._cells(df)
+        values = df[VALUE].to_numpy(dtype=float)
+        known = ~np.isnan(values)
+        bins = self._bins(values[known])
+        if flat is None or bins is None:
+            return None
+        size = math.prod(self.shape)
+        count = np.bincount(flat, minlength=size).reshape(self.shape)
+        flat, values = flat[known], values[known]
+        value_count = np.bincount(flat, minlength=size).reshape(self.shape)
+        value_sum = np.bincount(flat, weights=values, minlength=size).reshape(self.shape)
+        value_sumsq = np.bincount(flat, weights=values * values, minlength=size).reshape(self.shape)
+        n_bins = len(self.centers)
+        value_hist = (np.bincount(flat * n_bins + bins, minlength=size * n_bins)
+                      .astype(np.int32).reshape(self.shape + (n_bins,)))
+        return count, value_count, value_sum, value_sumsq, value_hist
+
+    def updated(self, delta):
+        """A new cube with the rows of ``delta`` added, or ``None`` if they do not fit its axes."""
+        added = self._accumulate(delta)
+        if added is None:
+            return None
+        cube = copy.copy(self)
+        cube.count, cube.value_count, cube.value_sum, cube.value_sumsq, cube.value_hist = (
+            a + b for a, b in zip((self.count, self.value_count, self.value_sum, self.value_sumsq,
+                                   self.value_hist), added))
+        cube.age_index = AgeIndex(cube.counts(["Gender", "Age"]).unstack("Age", fill_value=0))
+        return cube
+
+    def levels_present(self, dim):
+        """Levels of ``dim`` that occur at least once, sorted."""
+        counts = self.counts(dim)
+        return sorted(counts.index[counts.to_numpy() > 0].tolist())
+
+    def _reduce(self, array, by, age_range, filters):
+        unknown = set(filters) - set(DIMENSIONS)
+        if unknown:
+            raise KeyError(f"Unknown cube dimension(s): {sorted(unknown)}")
+        labels = []
+        for axis, dim in enumerate(DIMENSIONS):
+            keep = np.ones(self.shape[axis], dtype=bool)
+            if dim == "Age" and age_range is not None:
+                ages = np.arange(self.min_age, self.max_age + 1)
+                keep[:-1] = (ages >= age_range[0]) & (ages <= age_range[1])
+                keep[-1] = False
+            elif filters.get(dim) is not None:
+                keep[:] = False
+                if filters[dim] in self.levels[dim]:
+                    keep[self.levels[dim].index(filters[dim])] = True
+            if dim in by:
+                keep[-1] = False
+                labels.append([self.levels[dim][i] for i in np.flatnonzero(keep)])
+            array = array.compress(keep, axis=axis)
+        summed = tuple(a for a, d in enumerate(DIMENSIONS) if d not in by)
+        out = array.sum(axis=summed)
+        order = [d for d in DIMENSIONS if d in by]
+        return out, labels, order
+
+    def counts(self, by, age_range=None, **filters):
+        """Row counts grouped by ``by`` (a dimension or list of dimensions).
+
+        ``age_range`` is an inclusive ``(lo, hi)`` pair; other keyword
+        arguments pin a dimension to a single level, ``None`` meaning all.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        out, labels, order = self._reduce(self.count, by, age_range, filters)
+        index = pd.MultiIndex.from_product(labels, names=order) if len(by) > 1 else pd.Index(labels[0], name=by[0])
+        counts = pd.Series(out.reshape(-1), index=index, name="count")
+        return counts.reorder_levels(by) if len(by) > 1 else counts
+
+    def value_stats(self, by, age_range=None, **filters):
+        """Tumor_Size_mm count/mean/std/min/quartiles/max grouped by ``by``.
+
+        Means and standard deviations are exact; quartiles come from the
+        histogram sketch and are exact for integer sizes.
+        """
+        n, (labels,), _ = self._reduce(self.value_count, [by], age_range, filters)
+        total = self._reduce(self.value_sum, [by], age_range, filters)[0]
+        total_sq = self._reduce(self.value_sumsq, [by], age_range, filters)[0]
+        hist = self._reduce(self.value_hist, [by], age_range, filters)[0]
+        rows = [_summarize(hist[i], self.centers, int(n[i]), total[i], total_sq[i]) for i in range(len(labels))]
+        return pd.DataFrame(rows, index=pd.Index(labels, name=by)).loc[lambda t: t["count"] > 0]
+
+
+_cubes = data.DerivedCache("cube", DescriptiveCube, lambda cube, delta: cube.updated(delta))
+
+
+def load_cube(path=data.DATA_PATH):
+    """Return the process-wide cube for the current version of the dataset."""
+    return _cubes.get(path)
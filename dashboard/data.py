@@ -0,0 +1,414 @@
+"""Process-wide access to the postprocessed colorectal cancer dataset.
+
+Streamlit re-executes a page on every widget interaction, so reading the CSV
+inside the page means one full parse per click. The loader below parses the
+file once per process (per file version) and hands each caller a shallow
+view of the shared frame.
+
+Next to the CSV we keep a columnar copy (``<name>.columns/``): one ``.npy``
+file per numeric column, one ``.npy`` of category codes per string column and
+a ``manifest.json`` holding the category dictionaries and the SHA-256 of the
+CSV it was built from. When the manifest matches the CSV, the columns are
+memory-mapped instead of parsed. Build it ahead of a deploy with::
+
+    python -m dashboard.data
+
+New patients arrive as append-only delta files in ``<name>.deltas/`` (see
+``dashboard.ingest``). ``load_dataset`` returns the base rows followed by
+every delta, ``dataset_version`` identifies the base file together with its
+deltas, and values derived from the dataset are kept in a ``DerivedCache``,
+which applies only the deltas that arrived since it was last read.
+"""
+import argparse
+import functools
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from dashboard import metrics
+from dashboard.files import write_atomic
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_PATH = os.path.join(ROOT_DIR, "jupyter-notebooks", "postprocessed_colorectal_cancer_dataset.csv")
+
+CATEGORICAL_COLUMNS = [
+    "Gender", "Cancer_Stage", "Family_History", "Smoking_History", "Alcohol_Consumption",
+    "Obesity_BMI", "Diet_Risk", "Physical_Activity", "Diabetes", "Inflammatory_Bowel_Disease",
+    "Genetic_Mutation", "Screening_History", "Early_Detection", "Treatment_Type",
+    "Survival_5_years", "Mortality", "Survival_Prediction",
+]
+
+NUMERIC_DTYPES = {
+    "Patient_ID": "int64",
+    "Age": "int16",
+    "Tumor_Size_mm": "float64",
+    "Incidence_Rate_per_100K": "float64",
+    "Mortality_Rate_per_100K": "float64",
+}
+
+DTYPES = {**NUMERIC_DTYPES, **{c: "category" for c in CATEGORICAL_COLUMNS}}
+
+BINARY_COLUMNS = [
+    "Family_History", "Smoking_History", "Alcohol_Consumption", "Diabetes",
+    "Inflammatory_Bowel_Disease", "Genetic_Mutation", "Early_Detection",
+    "Survival_5_years", "Mortality", "Survival_Prediction",
+]
+
+ORDINAL_LEVELS = {
+    "Cancer_Stage": {"Localized": 1, "Regional": 2, "Metastatic": 3},
+    "Obesity_BMI": {"Normal": 0, "Overweight": 1, "Obese": 2},
+    "Diet_Risk": {"Low": 0, "Moderate": 1, "High": 2},
+    "Physical_Activity": {"Low": 0, "Moderate": 1, "High": 2},
+    "Screening_History": {"Never": 0, "Irregular": 1, "Regular": 2},
+}
+
+ENCODINGS = {**{c: {"No": 0, "Yes": 1} for c in BINARY_COLUMNS}, **ORDINAL_LEVELS}
+
+MISSING_CODE = -1
+
+_digests = {}
+
+
+def file_digest(path):
+    """SHA-256 of the contents of ``path`` as a hex string, read in 1 MiB chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_version(path=DATA_PATH):
+    """Return ``(mtime_ns, sha256)`` for ``path``.
+
+    The digest is only recomputed when the modification time or size changes,
+    so calling this on every rerun costs a single ``stat``.
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _digests:
+        _digests[key] = file_digest(path)
+    return stat.st_mtime_ns, _digests[key]
+
+
+def delta_dir(path=DATA_PATH):
+    """Directory holding the append-only delta files of ``path``."""
+    return os.path.splitext(path)[0] + ".deltas"
+
+
+def delta_names(path=DATA_PATH):
+    """Delta files of ``path`` (``<sequence>-<digest>.csv``), oldest first."""
+    try:
+        names = os.listdir(delta_dir(path))
+    except OSError:
+        return ()
+    return tuple(sorted(n for n in names if n.endswith(".csv") and n[:6].isdigit()))
+
+
+def _version(digest, names):
+    if not names:
+        return digest[:16]
+    return hashlib.sha256("\n".join((digest,) + tuple(names)).encode("utf-8")).hexdigest()[:16]
+
+
+def dataset_version(path=DATA_PATH):
+    """Short identifier of the dataset contents (base file and deltas), for keying derived caches."""
+    return _version(file_version(path)[1], delta_names(path))
+
+
+def read_csv(path=DATA_PATH):
+    """Parse the semicolon-separated dataset with explicit dtypes."""
+    return pd.read_csv(path, sep=";", dtype=DTYPES)
+
+
+def encode(df):
+    """Add an int8 ``<column>_Encoded`` column for every entry of ``ENCODINGS``.
+
+    Binary Yes/No columns become 1/0 and ordinal columns follow
+    ``ORDINAL_LEVELS``; missing or unrecognised values are ``MISSING_CODE``.
+    The lookup runs over category codes, so it costs one gather per column.
+    """
+    for name, mapping in ENCODINGS.items():
+        if name not in df.columns:
+            continue
+        col = df[name]
+        if not isinstance(col.dtype, pd.CategoricalDtype):
+            col = col.astype("category")
+        # Code -1 (missing) indexes the trailing MISSING_CODE entry.
+        lookup = np.array([mapping.get(c, MISSING_CODE) for c in col.cat.categories] + [MISSING_CODE],
+                          dtype=np.int8)
+        df[name + "_Encoded"] = lookup[col.cat.codes.to_numpy()]
+    return df
+
+
+@functools.lru_cache(maxsize=64)
+def _read_delta(file):
+    return encode(read_csv(file))
+
+
+def read_delta(name, path=DATA_PATH):
+    """Encoded rows of one delta file of ``path``.
+
+    Delta files never change once written, so each is parsed once per
+    process; treat the returned frame as read-only.
+    """
+    return _read_delta(os.path.join(delta_dir(path), name))
+
+
+def append_rows(frame, delta):
+    """``frame`` followed by the rows of ``delta``, with categorical levels merged."""
+    columns = {}
+    for name in frame.columns:
+        a, b = frame[name], delta[name]
+        if isinstance(a.dtype, pd.CategoricalDtype):
+            columns[name] = union_categoricals([a, b.astype("category")], sort_categories=True)
+        else:
+            columns[name] = np.concatenate([a.to_numpy(), b.to_numpy().astype(a.dtype)])
+    return pd.DataFrame(columns)
+
+
+def artifact_dir(path=DATA_PATH):
+    """Directory holding the columnar copy of ``path``."""
+    return os.path.splitext(path)[0] + ".columns"
+
+
+def read_manifest(store):
+    """Return the manifest of a columnar store, or ``None`` if there is none."""
+    try:
+        with open(os.path.join(store, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _codes_dtype(n_categories):
+    return np.int8 if n_categories < 127 else np.int16 if n_categories < 32767 else np.int32
+
+
+def _save_array(values, path):
+    # np.save appends ".npy" to a path without that suffix, so write through a handle.
+    with open(path, "wb") as f:
+        np.save(f, np.ascontiguousarray(values))
+
+
+def _save_json(obj, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+
+
+def write_columns(df, store, source_sha256):
+    """Write ``df`` to ``store`` as typed ``.npy`` columns plus a manifest.
+
+    Each column is written to a temporary file and moved into place, and the
+    manifest is swapped in last, so a rebuild never truncates a file that
+    another worker still has memory-mapped; the previous version's files are
+    removed afterwards. A store whose manifest already matches
+    ``source_sha256`` is left as it is.
+    """
+    manifest = read_manifest(store)
+    if (manifest is not None and manifest.get("source_sha256") == source_sha256
+            and all(os.path.exists(os.path.join(store, c["file"])) for c in manifest["columns"])):
+        return manifest
+    os.makedirs(store, exist_ok=True)
+    prefix = source_sha256[:16]
+    columns = []
+    for name in df.columns:
+        s = df[name]
+        if not isinstance(s.dtype, pd.CategoricalDtype) and not pd.api.types.is_numeric_dtype(s):
+            s = s.astype("category")
+        entry = {"name": name, "file": f"{prefix}-{name}.npy"}
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            categories = s.cat.categories
+            values = s.cat.codes.to_numpy().astype(_codes_dtype(len(categories)))
+            entry.update(kind="categorical", categories=categories.tolist(),
+                         ordered=bool(s.cat.ordered))
+        else:
+            values = s.to_numpy()
+            entry.update(kind="numeric")
+        entry["dtype"] = values.dtype.str
+        write_atomic(os.path.join(store, entry["file"]), functools.partial(_save_array, values))
+        columns.append(entry)
+
+    manifest = {"format": 1, "source_sha256": source_sha256, "rows": len(df), "columns": columns}
+    write_atomic(os.path.join(store, "manifest.json"), functools.partial(_save_json, manifest))
+
+    keep = {c["file"] for c in columns}
+    for stale in glob.glob(os.path.join(store, "*.npy")):
+        if os.path.basename(stale) not in keep:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return manifest
+
+
+def read_columns(store, manifest, mmap=True):
+    """Rebuild the frame described by ``manifest``, memory-mapping each column."""
+    mode = "r" if mmap else None
+    data = {}
+    for entry in manifest["columns"]:
+        values = np.load(os.path.join(store, entry["file"]), mmap_mode=mode)
+        if entry["kind"] == "categorical":
+            dtype = pd.CategoricalDtype(entry["categories"], ordered=entry["ordered"])
+            data[entry["name"]] = pd.Series(pd.Categorical.from_codes(values, dtype=dtype), copy=False)
+        else:
+            data[entry["name"]] = pd.Series(values, copy=False)
+    return pd.DataFrame(data, copy=False)
+
+
+def convert(path=DATA_PATH):
+    """Parse ``path`` and (re)write its columnar copy. Returns the manifest."""
+    _, digest = file_version(path)
+    return write_columns(read_csv(path), artifact_dir(path), digest)
+
+
+@metrics.cached("dataset", max_entries=2, show_spinner="Loading dataset...")
+def _load_shared(path, mtime_ns, digest):
+    store = artifact_dir(path)
+    manifest = read_manifest(store)
+    if manifest is None or manifest.get("source_sha256") != digest:
+        df = read_csv(path)
+        try:
+            manifest = write_columns(df, store, digest)
+        except OSError:
+            return encode(df)
+    # Reading back what was just written keeps every worker on the same
+    # read-only, memory-mapped buffers, so a stray in-place write raises
+    # instead of corrupting the frame other sessions see.
+    return encode(read_columns(store, manifest))
+
+
+def open_dataset(path=DATA_PATH):
+    """The dataset with its deltas, read from an existing columnar copy without writing anything.
+
+    For worker processes: the parent builds the copy (``load_dataset``) and
+    workers only map it. If the copy is missing or stale the CSV is parsed
+    in memory instead.
+    """
+    _, digest = file_version(path)
+    store = artifact_dir(path)
+    manifest = read_manifest(store)
+    if manifest is not None and manifest.get("source_sha256") == digest:
+        frame = encode(read_columns(store, manifest))
+    else:
+        frame = encode(read_csv(path))
+    for name in delta_names(path):
+        frame = append_rows(frame, read_delta(name, path))
+    return frame
+
+
+def _load_base(path=DATA_PATH):
+    mtime_ns, digest = file_version(path)
+    return _load_shared(path, mtime_ns, digest)
+
+
+class DerivedCache:
+    """A value derived from the dataset, kept current as deltas arrive.
+
+    ``build(df)`` computes the value from the full frame. ``update(value,
+    delta)``, if given, returns it advanced by the encoded rows of one delta
+    file, or ``None`` when the delta does not fit and the value has to be
+    rebuilt. ``source(path)``, if given, replaces ``load_dataset`` as the
+    input of ``build`` and reads the base file only; the deltas are then
+    applied with ``update``. The latest value is kept per dataset path, so a
+    process builds it once per base file and afterwards only applies new
+    deltas. Lookups are counted under ``name`` (see ``dashboard.metrics``) as
+    a ``hit``, an ``update`` or a ``miss``.
+    """
+
+    def __init__(self, name, build, update=None, source=None):
+        self.name = name
+        self.build = build
+        self.update = update
+        self.source = source
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def get(self, path=DATA_PATH):
+        base = file_version(path)
+        names = delta_names(path)
+        with self._lock:
+            key, applied, value = self._latest.get(path, (None, (), None))
+            if key == base and applied == names:
+                metrics.count(self.name, "hit")
+                return value
+            if key != base or self.update is None or names[:len(applied)] != applied:
+                value = None
+            outcome = "update"
+            if value is None and self.source is not None:
+                source = self.source(path)
+                with metrics.stage(f"build {self.name}"):
+                    value = self.build(source)
+                applied, outcome = (), "miss"
+            if value is not None:
+                with metrics.stage(f"update {self.name}"):
+                    for name in names[len(applied):]:
+                        value = self.update(value, read_delta(name, path))
+                        if value is None:
+                            break
+            if value is None:
+                source = load_dataset(path)
+                with metrics.stage(f"build {self.name}"):
+                    value = self.build(source)
+                outcome = "miss"
+            metrics.count(self.name, outcome)
+            self._latest[path] = (base, names, value)
+            if path == DATA_PATH:
+                metrics.set_version("dataset", _version(base[1], names))
+            return value
+
+
+_frames = DerivedCache("frame", build=lambda df: df, update=append_rows, source=_load_base)
+
+
+def load_dataset(path=DATA_PATH):
+    """Return the dataset (base rows, then every delta) shared by all sessions of this process.
+
+    The result is a shallow copy: assigning or dropping columns only affects
+    the caller's frame, while the underlying column buffers are shared. Use
+    the precomputed ``*_Encoded`` columns (see ``encode``) for numeric work
+    and boolean masks instead of re-mapping the label columns.
+    """
+    return _frames.get(path).copy(deep=False)
+
+
+def version_history(path=DATA_PATH):
+    """``(version, rows)`` after the base file and after each delta, oldest first.
+
+    Deltas only append rows, so the rows of an earlier version are a prefix
+    of the current frame.
+    """
+    digest = file_version(path)[1]
+    names = delta_names(path)
+    rows = len(_load_base(path))
+    history = [(_version(digest, ()), rows)]
+    for i, name in enumerate(names):
+        rows += len(read_delta(name, path))
+        history.append((_version(digest, names[:i + 1]), rows))
+    return history
+
+
+def describe_version(path=DATA_PATH):
+    """One line on the dataset version being shown, for the page sidebars."""
+    version, rows = version_history(path)[-1]
+    names = delta_names(path)
+    text = f"Dataset version {version} · {rows:,} patients"
+    if names:
+        updated = os.path.getmtime(os.path.join(delta_dir(path), names[-1]))
+        text += f" · {len(names)} update(s), latest {time.strftime('%Y-%m-%d %H:%M', time.localtime(updated))}"
+    return text
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the columnar copy of the postprocessed dataset.")
+    parser.add_argument("csv", nargs="?", default=DATA_PATH)
+    args = parser.parse_args()
+    manifest = convert(args.csv)
+    print(f"Wrote {manifest['rows']} rows x {len(manifest['columns'])} columns to {artifact_dir(args.csv)}")
@@ -0,0 +1,270 @@
+"""Per-patient SHAP explanations for the survival model.
+
+The model has six input features, and each maps to exactly one column of
+the preprocessed matrix the classifier sees. ``SurvivalExplainer`` therefore
+works in that model space and evaluates all 2**6 feature coalitions for the
+patient against a weighted k-means summary of the cohort. This gives the exact
+interventional Shapley values that ``shap.KernelExplainer`` estimates by
+sampling, from a single ``predict_proba`` batch whose size is capped by
+``max_evals``.
+
+The background summary and coalition weights are computed once per model and
+dataset version (``get_explainer``). Explanations are returned as data for the
+page to chart.
+
+For the KNN pipeline the prediction is itself a closed form: the share of the
+k nearest training patients who survived. ``NeighbourExplainer`` answers with
+those neighbours, their votes and each feature's share of their distance to
+the patient at the cost of one neighbour query. The Shapley explainer is kept
+as the slower, model-agnostic view.
+
+The page requests SHAP values through the background job queue
+(``request_explanation`` for one patient, ``request_global_shap`` for the
+cohort summary, which is written to ``CACHE_DIR``) and polls for the result.
+"""
+import math
+import os
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from dashboard import data, metrics
+from dashboard.files import write_atomic
+from dashboard.jobs import get_queue
+from dashboard.knn import TIE_TOLERANCE, compile_preprocessing
+from dashboard.prediction import CATEGORY_LEVELS, MODEL_COLUMNS, input_columns, normalize
+
+CACHE_DIR = os.environ.get("DASHBOARD_EXPLAIN_CACHE", os.path.join(data.ROOT_DIR, ".cache", "explanations"))
+GLOBAL_SAMPLE = 500
+
+
+def _shown(value):
+    return f"{value:g}" if isinstance(value, (int, float, np.number)) else str(value)
+
+
+class Explanation:
+    """SHAP values of one patient; ``base_value + values.sum() == prediction``."""
+
+    def __init__(self, base_value, prediction, values, data):
+        self.base_value = base_value
+        self.prediction = prediction
+        self.values = values
+        self.data = data
+
+    def frame(self):
+        """One row per feature, most influential first."""
+        out = pd.DataFrame({"Feature": self.values.index, "Value": [_shown(v) for v in self.data],
+                            "SHAP": self.values.to_numpy()})
+        return out.reindex(out["SHAP"].abs().sort_values(ascending=False).index).reset_index(drop=True)
+
+
+class SurvivalExplainer:
+    """Exact Shapley values over model features against a summarized background."""
+
+    def __init__(self, pipeline, background, n_background=20, max_evals=2048, random_state=42):
+        self.transform = pipeline[:-1]
+        self.clf = pipeline[-1]
+        self.positive = list(self.clf.classes_).index(1)
+        self.features = input_columns(self.transform.get_feature_names_out())
+        m = len(self.features)
+
+        self.masks = np.array(list(product([False, True], repeat=m)))
+        # phi_i = sum over coalitions S of weights[i, S] * v(S): v(S) enters with
+        # +(|S|-1)!(m-|S|)!/m! when i is in S and -|S|!(m-|S|-1)!/m! when it is not.
+        self.weights = np.zeros((m, len(self.masks)))
+        for j, mask in enumerate(self.masks):
+            s = int(mask.sum())
+            for i in range(m):
+                if mask[i]:
+                    self.weights[i, j] = math.factorial(s - 1) * math.factorial(m - s) / math.factorial(m)
+                else:
+                    self.weights[i, j] = -math.factorial(s) * math.factorial(m - s - 1) / math.factorial(m)
+
+        n_background = max(1, min(n_background, max_evals // len(self.masks)))
+        Z = self.transform.transform(background)
+        distinct, counts = np.unique(Z, axis=0, return_counts=True)
+        if len(distinct) <= n_background:
+            self.background, weights = distinct, counts
+        else:
+            from sklearn.cluster import KMeans
+            km = KMeans(n_clusters=n_background, n_init=4, random_state=random_state)
+            km.fit(distinct, sample_weight=counts)
+            self.background = km.cluster_centers_
+            weights = np.bincount(km.labels_, weights=counts, minlength=n_background)
+        self.background_weights = weights / weights.sum()
+        self.n_evals = len(self.masks) * len(self.background)
+        self.base_value = float(self._proba(self.background) @ self.background_weights)
+
+    def _proba(self, Z):
+        return self.clf.predict_proba(Z)[:, self.positive]
+
+    def _coalition_values(self, Z):
+        """Expected prediction per coalition (rows) and patient (columns) of model-space rows ``Z``."""
+        rows = np.where(self.masks[:, None, None, :], Z[None, :, None, :], self.background[None, None, :, :])
+        proba = self._proba(rows.reshape(-1, Z.shape[1]))
+        return proba.reshape(len(self.masks), len(Z), -1) @ self.background_weights
+
+    def explain(self, X):
+        """``Explanation`` of the first row of ``X`` (model input columns)."""
+        with metrics.stage("shap"):
+            z = self.transform.transform(X[MODEL_COLUMNS].iloc[:1])
+            value = self._coalition_values(z)[:, 0]
+        shap_values = self.weights @ value
+        return Explanation(
+            base_value=float(value[0]),
+            prediction=float(value[-1]),
+            values=pd.Series(shap_values, index=self.features),
+            data=X[self.features].iloc[0],
+        )
+
+    def shap_values(self, X, chunk_size=100):
+        """SHAP values of every row of ``X``, one column per feature."""
+        Z = self.transform.transform(X[MODEL_COLUMNS])
+        values = [(self.weights @ self._coalition_values(Z[i:i + chunk_size])).T for i in range(0, len(Z), chunk_size)]
+        return pd.DataFrame(np.vstack(values), columns=self.features, index=X.index)
+
+
+class NeighbourExplanation:
+    """The neighbours behind one KNN prediction.
+
+    ``neighbours`` has one row per neighbour with its decoded features,
+    outcome, distance and vote (``prediction`` is the sum of the votes);
+    ``distance_shares`` gives, per neighbour, each feature's share of the
+    squared distance. ``n_tied`` training patients lie exactly as far away as
+    the k-th neighbour, of whom ``tied_survival`` survived.
+    """
+
+    def __init__(self, prediction, base_value, neighbours, distance_shares, n_tied, tied_survival):
+        self.prediction = prediction
+        self.base_value = base_value
+        self.neighbours = neighbours
+        self.distance_shares = distance_shares
+        self.n_tied = n_tied
+        self.tied_survival = tied_survival
+
+    def feature_summary(self, data):
+        """Per feature: the patient's value, how many neighbours share it and its mean distance share."""
+        shown = self.neighbours[self.distance_shares.columns]
+        return pd.DataFrame({
+            "Patient": [_shown(data[f]) for f in shown.columns],
+            "Neighbours matching": [int(sum(_shown(v) == _shown(data[f]) for v in shown[f])) for f in shown.columns],
+            "Share of distance": self.distance_shares.mean().to_numpy(),
+        }, index=pd.Index(shown.columns, name="Feature"))
+
+
+class NeighbourExplainer:
+    """Closed-form explanation of a uniform-weight ``KNeighborsClassifier`` pipeline."""
+
+    def __init__(self, pipeline):
+        self.transform = pipeline[:-1]
+        self.clf = pipeline[-1]
+        self.positive = list(self.clf.classes_).index(1)
+        self.features = input_columns(self.transform.get_feature_names_out())
+        columns, age_column, (offset, slope, _), lookups = compile_preprocessing(self.transform, CATEGORY_LEVELS)
+
+        # Decoders from a model-space coordinate back to the input value.
+        self.decoders = []
+        for j, feature in enumerate(self.features):
+            if feature == age_column:
+                self.decoders.append(lambda v, j=j: np.round((v - offset[j]) / slope[j]).astype(int))
+            else:
+                levels, table = lookups[feature]
+                coords = offset[j] + table[:-1, j]
+                self.decoders.append(
+                    lambda v, coords=coords, levels=np.array(levels): levels[np.abs(v[:, None] - coords).argmin(1)])
+        self.base_value = float(np.mean(self.clf._y == self.positive))
+
+    def explain(self, X):
+        """``NeighbourExplanation`` of the first row of ``X`` (model input columns)."""
+        z = self.transform.transform(X[MODEL_COLUMNS].iloc[:1])
+        dist, idx = self.clf.kneighbors(z)
+        dist, idx = dist[0], idx[0]
+        points = self.clf._fit_X[idx]
+        survived = self.clf._y[idx] == self.positive
+        k = len(idx)
+
+        sq = (points - z) ** 2
+        total = sq.sum(axis=1, keepdims=True)
+        shares = np.divide(sq, total, out=np.zeros_like(sq), where=total > 0)
+
+        neighbours = pd.DataFrame({f: decode(points[:, j]) for j, (f, decode) in enumerate(zip(self.features,
+                                                                                               self.decoders))})
+        neighbours["Survived 5 years"] = np.where(survived, "Yes", "No")
+        neighbours["Distance"] = dist
+        neighbours["Vote"] = survived / k
+        neighbours.index = pd.RangeIndex(1, k + 1, name="Neighbour")
+
+        radius = dist[-1]
+        shell = self.clf._tree.query_radius(z, radius + TIE_TOLERANCE)[0]
+        shell_dist = np.linalg.norm(self.clf._fit_X[shell] - z, axis=1)
+        tied = shell[np.abs(shell_dist - radius) <= TIE_TOLERANCE]
+        return NeighbourExplanation(
+            prediction=float(survived.mean()),
+            base_value=self.base_value,
+            neighbours=neighbours,
+            distance_shares=pd.DataFrame(shares, columns=self.features, index=neighbours.index),
+            n_tied=len(tied),
+            tied_survival=float(np.mean(self.clf._y[tied] == self.positive)) if len(tied) else np.nan,
+        )
+
+
+@metrics.cached("neighbour explainer", max_entries=2, show_spinner=False)
+def _build_neighbour_shared(model_version, _pipeline):
+    return NeighbourExplainer(_pipeline)
+
+
+def get_neighbour_explainer(model):
+    """Return the process-wide neighbour explainer for a registry ``ModelHandle``."""
+    return _build_neighbour_shared(model.version, model.model)
+
+
+@metrics.cached("explainer", max_entries=2, show_spinner=False)
+def _build_shared(model_version, dataset_version, _pipeline):
+    X, _ = normalize(data.load_dataset()[MODEL_COLUMNS])
+    return SurvivalExplainer(_pipeline, X)
+
+
+def get_explainer(model):
+    """Return the process-wide explainer for a registry ``ModelHandle``."""
+    return _build_shared(model.version, data.dataset_version(), model.model)
+
+
+def request_explanation(model, X):
+    """``Future`` of the SHAP ``Explanation`` of the first row of ``X``, computed in the background."""
+    row = X[MODEL_COLUMNS].iloc[:1]
+    version = data.dataset_version()
+    key = ("patient-shap", model.version, version) + tuple(_shown(v) for v in row.iloc[0])
+    return get_queue().submit(key, lambda: _build_shared(model.version, version, model.model).explain(row))
+
+
+def global_shap_path(model_version, dataset_version, n_patients=GLOBAL_SAMPLE, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"v1-{model_version}-{dataset_version}-global-{n_patients}.parquet")
+
+
+def compute_global_shap(explainer, X, path, n_patients=GLOBAL_SAMPLE, random_state=42):
+    """SHAP values of a random sample of patients (Feature, Value, SHAP rows), written to ``path``."""
+    sample = X.sample(min(n_patients, len(X)), random_state=random_state)
+    with metrics.stage("global shap"):
+        values = explainer.shap_values(sample)
+    frame = pd.DataFrame({
+        "Feature": np.repeat(values.columns.to_numpy(), len(values)),
+        "Value": [_shown(v) for f in values.columns for v in sample[f]],
+        "SHAP": values.to_numpy().T.ravel(),
+    })
+    write_atomic(path, lambda tmp: frame.to_parquet(tmp, index=False))
+    return frame
+
+
+def _global_job(model, version, path):
+    X, _ = normalize(data.load_dataset()[MODEL_COLUMNS])
+    return compute_global_shap(_build_shared(model.version, version, model.model), X, path)
+
+
+def request_global_shap(model):
+    """The cohort SHAP summary as ``(frame, None)`` once it is on disk, else ``(None, future)``."""
+    version = data.dataset_version()
+    path = global_shap_path(model.version, version)
+    if os.path.exists(path):
+        return pd.read_parquet(path), None
+    return None, get_queue().submit(("global-shap", path), _global_job, model, version, path)
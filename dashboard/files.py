@@ -0,0 +1,23 @@
+"""File helpers shared by the modules that write artifacts.
+
+Kept free of Streamlit and the data stack so command-line tools can use
+them without loading the app.
+"""
+import os
+import threading
+
+
+def write_atomic(path, write):
+    """Call ``write(tmp_path)`` and move the result to ``path`` in one step.
+
+    Readers never see a partial file and concurrent writers cannot
+    interleave; the temporary file is removed if ``write`` fails.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
@@ -0,0 +1,218 @@
+"""Resumable permutation importance for the survival model.
+
+The notebook ran ``permutation_importance(..., scoring="roc_auc", n_repeats=5,
+n_jobs=-1)`` on the held-out test split, re-running the ``ColumnTransformer``
+for every permutation and starting over when interrupted.
+``PermutationImportance`` preprocesses the test set once and permutes the
+columns of that matrix. Every model input maps to its own output columns, so
+this matches permuting the raw column. (feature, repeat) tasks are scored in
+parallel batches, and each finished task is appended to a checkpoint file
+under ``CACHE_DIR``, keyed on model version, dataset version and settings. A
+rerun only scores the missing tasks, and ``results`` summarizes whatever has
+finished so far.
+
+The Prescriptive page runs it in a background thread (``get_job(model).start()``)
+and polls the checkpoint. To compute it from the command line::
+
+    python -m dashboard.importance --jobs 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from joblib import Parallel, delayed
+
+from dashboard import data
+from dashboard.prediction import MODEL_COLUMNS, input_columns, normalize
+
+CACHE_DIR = os.environ.get("DASHBOARD_IMPORTANCE_CACHE", os.path.join(data.ROOT_DIR, ".cache", "importance"))
+TARGET = "Survival_5_years"
+
+
+def load_test_set(path=data.DATA_PATH, test_size=0.2, random_state=42):
+    """The notebook's held-out split: model inputs and 0/1 five-year survival."""
+    from sklearn.model_selection import train_test_split
+
+    df = data.load_dataset(path)
+    X, _ = normalize(df[MODEL_COLUMNS])
+    y = (df[TARGET].astype(str).str.strip().str.lower() == "yes").astype("int8")
+    _, X_test, _, y_test = train_test_split(X, y, test_size=test_size, stratify=y, random_state=random_state)
+    return X_test, y_test.to_numpy()
+
+
+def _score_task(clf, positive, Z, y, columns, seed):
+    from sklearn.metrics import roc_auc_score
+
+    permuted = Z.copy()
+    order = np.random.default_rng(seed).permutation(len(Z))
+    permuted[:, columns] = Z[order][:, columns]
+    return roc_auc_score(y, clf.predict_proba(permuted)[:, positive])
+
+
+class PermutationImportance:
+    """ROC-AUC permutation importance with a per-task checkpoint file."""
+
+    def __init__(self, pipeline, X, y, n_repeats=5, random_state=42, checkpoint=None):
+        self.clf = pipeline[-1]
+        self.positive = list(self.clf.classes_).index(1)
+        self.Z = np.ascontiguousarray(pipeline[:-1].transform(X[MODEL_COLUMNS]))
+        self.y = np.asarray(y)
+        owners = input_columns(pipeline[:-1].get_feature_names_out())
+        self.columns = {f: [j for j, o in enumerate(owners) if o == f] for f in MODEL_COLUMNS}
+        self.n_repeats = n_repeats
+        self.random_state = random_state
+        self.checkpoint = checkpoint
+        from sklearn.metrics import roc_auc_score
+        self.baseline = roc_auc_score(self.y, self.clf.predict_proba(self.Z)[:, self.positive])
+
+    def tasks(self):
+        return [(f, r) for r in range(self.n_repeats) for f in MODEL_COLUMNS]
+
+    def completed(self):
+        return read_checkpoint(self.checkpoint) if self.checkpoint else []
+
+    def run(self, n_jobs=-1, batch_size=None, progress=None):
+        """Score every task missing from the checkpoint. Returns ``results()``.
+
+        ``progress(done, total)`` is called after each batch.
+        """
+        done = {(r["feature"], r["repeat"]) for r in self.completed()}
+        todo = [t for t in self.tasks() if t not in done]
+        n_workers = os.cpu_count() if n_jobs == -1 else n_jobs
+        batch_size = batch_size or max(n_workers, 1)
+        if self.checkpoint:
+            os.makedirs(os.path.dirname(self.checkpoint), exist_ok=True)
+            _drop_torn_line(self.checkpoint)
+        # Threads share the preprocessed matrix; the neighbour search releases the GIL.
+        with Parallel(n_jobs=n_jobs, prefer="threads") as parallel:
+            for start in range(0, len(todo), batch_size):
+                batch = todo[start:start + batch_size]
+                scores = parallel(delayed(_score_task)(
+                    self.clf, self.positive, self.Z, self.y, self.columns[f],
+                    [self.random_state, MODEL_COLUMNS.index(f), r]) for f, r in batch)
+                records = [{"feature": f, "repeat": r, "score": s, "importance": self.baseline - s}
+                           for (f, r), s in zip(batch, scores)]
+                if self.checkpoint:
+                    with open(self.checkpoint, "a", encoding="utf-8") as out:
+                        out.write("".join(json.dumps(rec) + "\n" for rec in records))
+                        out.flush()
+                        os.fsync(out.fileno())
+                if progress:
+                    progress(len(done) + start + len(batch), len(self.tasks()))
+        return self.results()
+
+    def results(self):
+        """Mean and standard deviation of the AUC drop per feature, most important first."""
+        return summarize(self.completed(), self.n_repeats)
+
+
+def read_checkpoint(path):
+    """Task records in ``path``; a torn last line from an interrupted run is ignored."""
+    records = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass
+    return records
+
+
+def _drop_torn_line(path):
+    """Cut a partial last line left by an interrupted write, so appends start on a fresh line."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        content = f.read()
+        if content and not content.endswith(b"\n"):
+            f.truncate(content.rfind(b"\n") + 1)
+
+
+def summarize(records, n_repeats):
+    """Mean and standard deviation of the AUC drop per feature from task records."""
+    frame = pd.DataFrame(records, columns=["feature", "repeat", "score", "importance"])
+    out = (frame.groupby("feature")["importance"].agg(["mean", "std", "count"])
+           .reindex(MODEL_COLUMNS).fillna({"count": 0}))
+    out.columns = ["importance_mean", "importance_std", "repeats_done"]
+    out["repeats_done"] = out["repeats_done"].astype(int)
+    out.index.name = "feature"
+    return out.sort_values("importance_mean", ascending=False).assign(repeats_total=n_repeats)
+
+
+def checkpoint_path(model_version, dataset_version, n_repeats, random_state, cache_dir=CACHE_DIR):
+    settings = hashlib.sha1(json.dumps([n_repeats, random_state, "roc_auc"]).encode()).hexdigest()[:8]
+    return os.path.join(cache_dir, f"v1-{model_version}-{dataset_version}-{settings}.jsonl")
+
+
+class ImportanceJob:
+    """A background run over one checkpoint, polled by the page."""
+
+    def __init__(self, model, path=data.DATA_PATH, n_repeats=5, random_state=42, n_jobs=2):
+        self.checkpoint = checkpoint_path(model.version, data.dataset_version(path), n_repeats, random_state)
+        self.model = model
+        self.path = path
+        self.n_repeats = n_repeats
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+        self.baseline = None
+        self.error = None
+        self.thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """Start (or resume) the computation unless it is already running."""
+        with self._lock:
+            if not self.running:
+                self.error = None
+                self.thread = threading.Thread(target=self._run, name="permutation-importance", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        try:
+            X, y = load_test_set(self.path, random_state=self.random_state)
+            job = PermutationImportance(self.model.model, X, y, self.n_repeats, self.random_state, self.checkpoint)
+            self.baseline = job.baseline
+            job.run(n_jobs=self.n_jobs)
+        except Exception as e:  # reported on the page instead of killing the thread silently
+            self.error = e
+
+    def results(self):
+        return summarize(read_checkpoint(self.checkpoint), self.n_repeats)
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _job(model_version, dataset_version, _model):
+    return ImportanceJob(_model)
+
+
+def get_job(model):
+    """The process-wide importance job for a registry ``ModelHandle`` and the current dataset."""
+    return _job(model.version, data.dataset_version(), model)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute (or resume) permutation importance for the survival model.")
+    parser.add_argument("--jobs", type=int, default=-1)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from dashboard.registry import get_model
+    model = get_model()
+    X, y = load_test_set(random_state=args.seed)
+    path = checkpoint_path(model.version, data.dataset_version(), args.repeats, args.seed)
+    job = PermutationImportance(model.model, X, y, args.repeats, args.seed, path)
+    print(f"Baseline ROC-AUC on {len(y):,} held-out patients: {job.baseline:.4f}")
+    results = job.run(n_jobs=args.jobs, progress=lambda done, total: print(f"  {done}/{total} tasks"))
+    print(results.round(4))
+    print(f"Checkpoint: {path}")
@@ -0,0 +1,100 @@
+"""Append new patients to the dataset as delta files.
+
+The registry's daily extract goes through the same cleaning as the full
+rebuild (``dashboard.preprocess``) and is stored as one file in
+``<dataset>.deltas/``, named ``<sequence>-<digest>.csv``. Delta files are
+never modified: the pages pick them up on their next rerun, and the cached
+frame, aggregates, correlation ranks and cluster assignments are advanced by
+the new rows only (see ``dashboard.data.DerivedCache``). Ingesting the same
+extract twice is a no-op, since its digest is already present.
+
+``compact`` folds the deltas back into the base CSV, e.g. before a deploy, so
+the next start builds everything from a single file again::
+
+    python -m dashboard.ingest path/to/new_patients.csv
+    python -m dashboard.ingest --compact
+"""
+import argparse
+import glob
+import os
+import shutil
+
+from dashboard import data
+from dashboard.files import write_atomic
+from dashboard.preprocess import CHUNK_ROWS, preprocess
+
+
+def ingest(source, path=data.DATA_PATH, chunksize=CHUNK_ROWS, sep=";"):
+    """Clean ``source`` and add it as the next delta of ``path``.
+
+    Returns the delta file name (``None`` if ``source`` had no usable rows or
+    was already ingested) and the ``preprocess`` report.
+    """
+    directory = data.delta_dir(path)
+    os.makedirs(directory, exist_ok=True)
+    staged = os.path.join(directory, f".incoming-{os.getpid()}.csv")
+    try:
+        report = preprocess(source, staged, chunksize, sep=sep)
+        if not report["rows_written"]:
+            return None, report
+        digest = data.file_digest(staged)[:16]
+        names = data.delta_names(path)
+        if any(n.endswith(f"-{digest}.csv") for n in names):
+            return None, report
+        sequence = int(names[-1][:6]) + 1 if names else 1
+        name = f"{sequence:06d}-{digest}.csv"
+        os.replace(staged, os.path.join(directory, name))
+        return name, report
+    finally:
+        if os.path.exists(staged):
+            os.remove(staged)
+
+
+def compact(path=data.DATA_PATH):
+    """Append every delta to the base CSV and remove them. Returns the number of files folded in."""
+    directory = data.delta_dir(path)
+    names = data.delta_names(path)
+    if not names:
+        return 0
+    # Move the deltas aside first so readers never see a row twice.
+    folding = f"{directory}.compacting-{os.getpid()}"
+    os.replace(directory, folding)
+
+    def write(tmp):
+        with open(tmp, "wb") as out:
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, out)
+            for name in names:
+                with open(os.path.join(folding, name), "rb") as f:
+                    f.readline()
+                    shutil.copyfileobj(f, out)
+
+    try:
+        write_atomic(path, write)
+    except BaseException:
+        os.replace(folding, directory)
+        raise
+    for stale in glob.glob(os.path.join(folding, "*")):
+        os.remove(stale)
+    os.rmdir(folding)
+    return len(names)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append new patients to the dataset as a delta file.")
+    parser.add_argument("source", nargs="?")
+    parser.add_argument("--data", default=data.DATA_PATH)
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--compact", action="store_true", help="fold the existing deltas into the base CSV")
+    args = parser.parse_args()
+
+    if args.compact:
+        print(f"Folded {compact(args.data)} delta file(s) into {args.data}")
+    elif args.source is None:
+        parser.error("a source file or --compact is required")
+    else:
+        name, report = ingest(args.source, args.data, args.chunksize)
+        for key, value in report.items():
+            print(f"{key}: {value:,}")
+        print(f"Added {name}" if name else "Nothing to add (no rows, or already ingested)")
+        print(data.describe_version(args.data).replace(" · ", "\n"))
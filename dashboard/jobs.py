@@ -0,0 +1,82 @@
+"""Background job queue for the explanations on the Prescriptive page.
+
+SHAP values take from a fraction of a second (one patient, once the explainer
+is built) to tens of seconds (the global summary), so the page submits them
+here instead of computing them on the script thread, and polls the returned
+``Future`` from a fragment while the other widgets stay interactive.
+
+``JobQueue.submit`` is keyed: a request whose key is already queued, running
+or recently finished gets the existing ``Future``, so sessions asking for the
+same explanation at the same time share one computation. Finished jobs are
+kept (up to ``max_done``, least recently used first out) until ``forget``
+drops them. A failed job reports its error to the polls that follow, and is
+run again by the first ``submit`` after ``retry_after`` seconds, so a
+transient failure (a timeout, running out of memory) does not stick. Jobs
+that produce files write them with ``dashboard.files.write_atomic``, so
+readers never see a partial artifact and concurrent writers cannot interleave.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from dashboard import metrics
+
+
+class JobQueue:
+    """A thread pool whose jobs are deduplicated by key."""
+
+    def __init__(self, max_workers=2, max_done=256, retry_after=30.0):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="explain")
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_done = max_done
+        self.retry_after = retry_after
+
+    def submit(self, key, fn, *args, **kwargs):
+        """``Future`` of ``fn(*args, **kwargs)``, shared with any other request for ``key``."""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None and self._retry_due(future):
+                future = None
+            metrics.count("jobs", "hit" if future is not None else "miss")
+            if future is None:
+                future = self._pool.submit(fn, *args, **kwargs)
+                future.add_done_callback(_stamp)
+                self._futures[key] = future
+                self._evict()
+            self._futures.move_to_end(key)
+            return future
+
+    def forget(self, key):
+        """Drop ``key`` so that the next ``submit`` runs the job again."""
+        with self._lock:
+            self._futures.pop(key, None)
+
+    def pending(self):
+        """Number of jobs queued or running."""
+        with self._lock:
+            return sum(not f.done() for f in self._futures.values())
+
+    def _retry_due(self, future):
+        if not future.done() or future.cancelled() or future.exception() is None:
+            return False
+        finished_at = getattr(future, "finished_at", None)
+        return finished_at is not None and time.monotonic() - finished_at >= self.retry_after
+
+    def _evict(self):
+        done = [k for k, f in self._futures.items() if f.done()]
+        for key in done[:max(0, len(done) - self.max_done)]:
+            del self._futures[key]
+
+
+def _stamp(future):
+    future.finished_at = time.monotonic()
+
+
+@st.cache_resource(show_spinner=False)
+def get_queue():
+    """The process-wide explanation queue."""
+    return JobQueue()
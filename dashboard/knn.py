@@ -0,0 +1,216 @@
+"""Compact nearest-neighbour engine for the KNN survival model.
+
+The shipped pipeline (preprocessing, ``MinMaxScaler``, ``KNeighborsClassifier``)
+keeps all training rows and runs a ``ColumnTransformer`` over pandas for each
+request, which dominates single-patient latency. ``FastKNN`` is built from the
+fitted pipeline and keeps the same ``predict``/``predict_proba`` interface:
+
+* the preprocessing is compiled into one lookup table per categorical column
+  and an affine map for Age, checked against the pipeline when built;
+* the training matrix, whose features are almost all discrete, is reduced to
+  its distinct points (float32, C-contiguous) with per-class counts, indexed
+  by a ``cKDTree``;
+* neighbours tied with the k-th one share the remaining votes in proportion
+  to their counts. The stock estimator instead keeps whichever tied rows its
+  tree visits first, so its probabilities depend on the tree layout; the two
+  agree wherever there is no tie at the k-th distance.
+
+``eps > 0`` turns the search into a (1 + eps)-approximate one. The
+Predictive Analytics page serves predictions through it when
+``DASHBOARD_KNN_ENGINE=fast`` is set.
+
+Run ``python -m dashboard.knn`` to compare latency, memory and agreement with
+the stock estimator.
+"""
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+TIE_TOLERANCE = 1e-5
+
+
+class FastKNN:
+    """Drop-in ``predict``/``predict_proba`` replacement for a fitted KNN pipeline."""
+
+    def __init__(self, columns, age_column, age_affine, lookups, points, counts, classes, n_neighbors,
+                 eps=0.0, leafsize=16):
+        self.columns = list(columns)
+        self.age_column = age_column
+        self.age_affine = age_affine
+        self.lookups = lookups
+        self.points = np.ascontiguousarray(points, dtype=np.float32)
+        self.counts = np.ascontiguousarray(counts, dtype=np.int32)
+        self.classes_ = np.asarray(classes)
+        self.n_neighbors = int(n_neighbors)
+        self.eps = eps
+        self.tree = cKDTree(self.points, leafsize=leafsize, balanced_tree=False)
+
+    @classmethod
+    def from_pipeline(cls, pipeline, feature_levels, age_column="Age", **kwargs):
+        """Compile ``pipeline`` for inputs whose categorical columns take ``feature_levels``."""
+        clf = pipeline[-1]
+        if getattr(clf, "weights", "uniform") != "uniform" or clf.effective_metric_ != "euclidean":
+            raise ValueError("FastKNN supports uniform-weight euclidean KNeighborsClassifier only")
+        engine_args = compile_preprocessing(pipeline[:-1], feature_levels, age_column)
+        points, inverse = np.unique(clf._fit_X.astype(np.float32), axis=0, return_inverse=True)
+        counts = np.zeros((len(points), len(clf.classes_)), dtype=np.int32)
+        np.add.at(counts, (inverse.reshape(-1), clf._y), 1)
+        return cls(*engine_args, points, counts, clf.classes_, clf.n_neighbors, **kwargs)
+
+    @staticmethod
+    def _transform_with(columns, age_column, age_affine, lookups, X):
+        offset, slope, missing = age_affine
+        age = pd.to_numeric(X[age_column], errors="coerce").to_numpy(dtype=np.float64)
+        out = np.where(np.isnan(age)[:, None], missing, offset + age[:, None] * slope)
+        for c, (levels, table) in lookups.items():
+            col = X[c]
+            if isinstance(col.dtype, pd.CategoricalDtype) and list(col.cat.categories) == levels:
+                codes = col.cat.codes.to_numpy()
+            else:
+                codes = pd.Categorical(col, categories=levels).codes
+            out += table[np.where(codes < 0, len(levels), codes)]
+        return out
+
+    def transform(self, X):
+        """Model-space coordinates of ``X`` (a frame with the model columns)."""
+        return self._transform_with(self.columns, self.age_column, self.age_affine, self.lookups, X)
+
+    def _votes(self, Z):
+        k = self.n_neighbors
+        kq = min(len(self.points), max(4 * k, 16))
+        dist, idx = self.tree.query(Z, kq, eps=self.eps)
+        dist, idx = dist.reshape(len(Z), kq), idx.reshape(len(Z), kq)
+        counts = self.counts[idx]
+        per_point = counts.sum(axis=2)
+        boundary = np.argmax(np.cumsum(per_point, axis=1) >= k, axis=1)
+        radius = dist[np.arange(len(Z)), boundary][:, None]
+        inside = dist < radius - TIE_TOLERANCE
+        tied = ~inside & (dist <= radius + TIE_TOLERANCE)
+
+        votes = (counts * inside[..., None]).sum(axis=1).astype(np.float64)
+        remaining = k - (per_point * inside).sum(axis=1)
+        tied_counts = (counts * tied[..., None]).sum(axis=1)
+        votes += tied_counts * (remaining / tied_counts.sum(axis=1))[:, None]
+
+        # Ties reaching past the queried neighbours: collect the whole shell.
+        for row in np.flatnonzero(tied[:, -1]):
+            near = self.tree.query_ball_point(Z[row], radius[row, 0] + TIE_TOLERANCE)
+            d = np.linalg.norm(self.points[near] - Z[row], axis=1)
+            shell = np.abs(d - radius[row, 0]) <= TIE_TOLERANCE
+            inner = self.counts[near][~shell & (d < radius[row, 0])].sum(axis=0)
+            outer = self.counts[near][shell].sum(axis=0)
+            votes[row] = inner + outer * (k - inner.sum()) / outer.sum()
+        return votes
+
+    def predict_proba(self, X):
+        Z = self.transform(X).astype(np.float32)
+        return self._votes(Z) / self.n_neighbors
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    @property
+    def nbytes(self):
+        return self.points.nbytes + self.counts.nbytes
+
+
+def compile_preprocessing(transform, feature_levels, age_column="Age"):
+    """Reduce a fitted preprocessing pipeline to an Age affine map and per-column lookups.
+
+    Returns ``(columns, age_column, age_affine, lookups)``: ``age_affine`` is
+    ``(offset, slope, missing)`` over the output columns, ``lookups[c]`` is
+    ``(levels, table)`` with one row per level plus a last row for missing
+    values, holding that column's change to the output relative to its first
+    level. Raises ``ValueError`` if the transform is not column-separable.
+    """
+    columns = [age_column] + list(feature_levels)
+
+    # Probe one column at a time around a reference row; the transform must be
+    # column-separable for the lookup tables to reproduce it.
+    reference = {c: [levels[0]] for c, levels in feature_levels.items()}
+    base = pd.DataFrame({age_column: [0.0, 1.0, np.nan], **{c: v * 3 for c, v in reference.items()}})[columns]
+    z = transform.transform(base).astype(np.float64)
+    age_affine = (z[0], z[1] - z[0], z[2])
+    lookups = {}
+    for c, levels in feature_levels.items():
+        probe = pd.DataFrame({age_column: 0.0, **{k: v * (len(levels) + 1) for k, v in reference.items()}})
+        probe[c] = list(levels) + [np.nan]
+        lookups[c] = (list(levels), transform.transform(probe[columns]).astype(np.float64) - z[0])
+
+    compiled = (columns, age_column, age_affine, lookups)
+    check = pd.DataFrame({age_column: np.linspace(20, 90, 64)})
+    rng = np.random.default_rng(0)
+    for c, levels in feature_levels.items():
+        check[c] = rng.choice(list(levels), len(check))
+    if not np.allclose(transform.transform(check[columns]), FastKNN._transform_with(*compiled, check), atol=1e-6):
+        raise ValueError("Pipeline preprocessing is not column-separable; it cannot be compiled")
+    return compiled
+
+
+def stock_nbytes(pipeline):
+    """Bytes held by the stock estimator's training matrix, labels and tree."""
+    clf = pipeline[-1]
+    tree = getattr(clf, "_tree", None)
+    tree_bytes = sum(a.nbytes for a in tree.get_arrays()) if tree is not None else 0
+    return clf._fit_X.nbytes + clf._y.nbytes + tree_bytes
+
+
+def benchmark(pipeline, X, y=None, repeats=200, eps_values=(0.0, 0.5)):
+    """Latency, memory and agreement of ``FastKNN`` against ``pipeline`` on ``X``.
+
+    With observed outcomes ``y`` the accuracy of both engines is reported too.
+    """
+    import time
+    from dashboard.prediction import CATEGORY_LEVELS
+
+    def timed(f, *args):
+        f(*args)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            f(*args)
+        return (time.perf_counter() - start) / repeats * 1000
+
+    start = time.perf_counter()
+    reference = pipeline.predict_proba(X)
+    rows = [{
+        "engine": "stock", "build_s": 0.0, "single_ms": timed(pipeline.predict_proba, X.head(1)),
+        "batch_ms": (time.perf_counter() - start) * 1000, "memory_mb": stock_nbytes(pipeline) / 1e6,
+        "label_agreement": 1.0, "mean_abs_proba_diff": 0.0,
+        "accuracy": np.mean(pipeline.classes_[reference.argmax(1)] == y) if y is not None else np.nan,
+    }]
+    for eps in eps_values:
+        start = time.perf_counter()
+        engine = FastKNN.from_pipeline(pipeline, CATEGORY_LEVELS, eps=eps)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        proba = engine.predict_proba(X)
+        batch = (time.perf_counter() - start) * 1000
+        rows.append({
+            "engine": f"fast (eps={eps})", "build_s": build, "single_ms": timed(engine.predict_proba, X.head(1)),
+            "batch_ms": batch, "memory_mb": engine.nbytes / 1e6,
+            "label_agreement": float((proba.argmax(1) == reference.argmax(1)).mean()),
+            "mean_abs_proba_diff": float(np.abs(proba - reference).mean()),
+            "accuracy": np.mean(engine.classes_[proba.argmax(1)] == y) if y is not None else np.nan,
+        })
+    return pd.DataFrame(rows).set_index("engine")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import joblib
+
+    from dashboard.data import DATA_PATH
+    from dashboard.prediction import MODEL_COLUMNS, MODEL_PATH, normalize
+
+    parser = argparse.ArgumentParser(description="Benchmark FastKNN against the stock KNN pipeline.")
+    parser.add_argument("--csv", default=DATA_PATH)
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    patients = pd.read_csv(args.csv, sep=";", usecols=MODEL_COLUMNS + ["Survival_5_years"], nrows=args.rows)
+    X, _ = normalize(patients)
+    y = (patients["Survival_5_years"] == "Yes").astype(int).to_numpy()
+    pd.set_option("display.width", 200)
+    pd.set_option("display.max_columns", None)
+    print(benchmark(joblib.load(MODEL_PATH), X, y).round(4))
@@ -0,0 +1,92 @@
+"""Precomputed predictions over the whole discrete input space.
+
+Age is validated as a number in [0, 120] and the other five model inputs are
+categoricals with 3, 2, 2, 3 and 3 levels, so every integer-aged patient is
+one of 121 x 108 = 13,068 possible inputs. ``PredictionTable`` scores that
+grid once with the wrapped model (a quarter of a second for the KNN pipeline)
+and answers ``predict_proba`` by indexing an array with the category codes.
+Rows outside the grid (fractional or missing ages, missing categories) are
+passed to the model, so the results are those of the model itself.
+
+The registry wraps every model it serves in one (``ModelHandle.predictor``);
+set ``DASHBOARD_PREDICTION_TABLE=0`` to score with the model directly.
+Run ``python -m dashboard.lookup`` to compare latency with the model.
+"""
+import numpy as np
+import pandas as pd
+
+from dashboard.prediction import CATEGORY_LEVELS, MODEL_COLUMNS
+
+AGE_RANGE = (0, 120)
+
+
+class PredictionTable:
+    """``predict``/``predict_proba`` by table lookup, falling back to ``model`` off the grid."""
+
+    def __init__(self, model, feature_levels=CATEGORY_LEVELS, age_range=AGE_RANGE, age_column="Age"):
+        self.model = model
+        self.classes_ = np.asarray(model.classes_)
+        self.age_column = age_column
+        self.age_min, self.age_max = age_range
+        self.levels = {c: list(feature_levels[c]) for c in MODEL_COLUMNS if c != age_column}
+        self.shape = (self.age_max - self.age_min + 1,) + tuple(len(v) for v in self.levels.values())
+
+        grid = pd.MultiIndex.from_product(
+            [np.arange(self.age_min, self.age_max + 1)] + list(self.levels.values()),
+            names=[age_column] + list(self.levels)).to_frame(index=False)
+        for c, levels in self.levels.items():
+            grid[c] = pd.Categorical(grid[c], categories=levels)
+        self.table = np.ascontiguousarray(model.predict_proba(grid[MODEL_COLUMNS]))
+
+    def index(self, X):
+        """Flat table row of each row of ``X``, or -1 where it is off the grid."""
+        age = pd.to_numeric(X[self.age_column], errors="coerce").to_numpy(dtype=float)
+        with np.errstate(invalid="ignore"):
+            ok = (age == np.round(age)) & (age >= self.age_min) & (age <= self.age_max)
+        codes = [np.where(ok, age - self.age_min, 0).astype(np.intp)]
+        for c, levels in self.levels.items():
+            col = X[c]
+            if not (isinstance(col.dtype, pd.CategoricalDtype) and list(col.cat.categories) == levels):
+                col = pd.Categorical(col, categories=levels)
+            code = np.asarray(col.codes if isinstance(col, pd.Categorical) else col.cat.codes, dtype=np.intp)
+            ok &= code >= 0
+            codes.append(np.maximum(code, 0))
+        return np.where(ok, np.ravel_multi_index(codes, self.shape), -1)
+
+    def predict_proba(self, X):
+        rows = self.index(X)
+        missed = rows < 0
+        if not missed.any():
+            return self.table[rows]
+        proba = np.empty((len(rows), self.table.shape[1]))
+        proba[~missed] = self.table[rows[~missed]]
+        proba[missed] = self.model.predict_proba(X[missed])
+        return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+
+if __name__ == "__main__":
+    import time
+
+    from dashboard.prediction import normalize
+    from dashboard.registry import get_model
+
+    model = get_model().model
+    start = time.perf_counter()
+    table = PredictionTable(model)
+    print(f"Scored {len(table.table):,} inputs in {time.perf_counter() - start:.2f}s ({table.nbytes / 1e3:.0f} kB)")
+
+    X, _ = normalize(pd.DataFrame([{"Age": 63, "Obesity_BMI": "Obese", "Family_History": "No",
+                                    "Alcohol_Consumption": "Yes", "Diet_Risk": "High",
+                                    "Screening_History": "Never"}]))
+    for name, predictor in [("model", model), ("table", table)]:
+        start = time.perf_counter()
+        for _ in range(200):
+            predictor.predict_proba(X)
+        print(f"{name}: {(time.perf_counter() - start) / 200 * 1e3:.3f} ms per patient")
@@ -0,0 +1,356 @@
+"""Per-rerun stage timings and cache hit rates.
+
+Every page calls ``begin_page`` first and ``end_page`` last. In between,
+``with stage("name"):`` times one step of the rerun, ``plotly_chart`` times
+the serialization of a figure and ``count(cache, outcome)`` records a cache
+lookup. Cached builders are declared with ``cached(name, ...)`` instead of
+``st.cache_resource``, which counts a ``hit`` per call answered from the
+cache and a ``miss`` (plus a ``build <name>`` stage) per call that ran the
+builder. Timings taken in a fragment rerun are filed under the page that
+drew the fragment, and those taken outside a page script (background jobs,
+warm-up) under the page ``background``.
+
+Each timing is labelled with the dataset and model versions current when it
+was taken (``set_version``), so after an update the same stage appears once
+per version and ``regressions`` compares them. The numbers are kept in
+memory per process and exported three ways:
+
+* the Diagnostics page (``pages/7_Diagnostics.py``, reachable by URL but not
+  listed in the sidebar);
+* one JSON line per rerun appended to ``DASHBOARD_METRICS_LOG``, if set;
+* Prometheus text format (``prometheus_text``), served on
+  ``http://<host>:$DASHBOARD_METRICS_PORT/metrics`` if that is set.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+BACKGROUND = "background"
+RERUN = "rerun"
+DIAGNOSTICS_PAGE = "Diagnostics"
+
+LOG_PATH = os.environ.get("DASHBOARD_METRICS_LOG")
+PORT = os.environ.get("DASHBOARD_METRICS_PORT")
+
+logger = logging.getLogger(__name__)
+
+
+class Timing:
+    """Count, sum and maximum of a stage's durations, plus the most recent ones for quantiles."""
+
+    def __init__(self, recent=256):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.first_seen = time.time()
+        self.recent = deque(maxlen=recent)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.first_seen = min(self.first_seen, other.first_seen)
+        self.recent.extend(other.recent)
+
+    def quantile(self, q):
+        return float(np.quantile(self.recent, q)) if self.recent else float("nan")
+
+
+class _Run:
+    def __init__(self, page):
+        self.page = page
+        self.start = self.last = time.perf_counter()
+        self.stages = Counter()
+        self.caches = Counter()
+
+
+class Metrics:
+    """Process-wide store of stage timings and cache counters."""
+
+    def __init__(self, log_path=None):
+        self.log_path = log_path
+        self.versions = {"dataset": "", "model": ""}
+        self.stages = {}
+        self.caches = Counter()
+        self._runs = {}
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def _session(self):
+        ctx = get_script_run_ctx(suppress_warning=True)
+        return ctx.session_id if ctx is not None else None
+
+    def set_version(self, kind, version):
+        """Label the timings that follow with ``version`` of ``kind`` (``dataset`` or ``model``).
+
+        Timings taken before the first version of a kind was known are
+        relabelled with it, since that is the version they were waiting for.
+        """
+        with self._lock:
+            if self.versions[kind] == version:
+                return
+            first = not self.versions[kind]
+            self.versions[kind] = version
+            if not first:
+                return
+            i = 2 if kind == "dataset" else 3
+            for key in [k for k in self.stages if not k[i]]:
+                timing = self.stages.pop(key)
+                key = key[:i] + (version,) + key[i + 1:]
+                if key in self.stages:
+                    self.stages[key].merge(timing)
+                else:
+                    self.stages[key] = timing
+
+    def record(self, name, seconds):
+        """Add one duration of stage ``name`` to the current page (or ``background``)."""
+        session = self._session()
+        with self._lock:
+            run = self._runs.get(session)
+            page = run.page if run is not None else self._pages.get(session, BACKGROUND)
+            if run is not None:
+                run.stages[name] += seconds
+                run.last = time.perf_counter()
+            key = (page, name, self.versions["dataset"], self.versions["model"])
+            timing = self.stages.get(key)
+            if timing is None:
+                timing = self.stages[key] = Timing()
+            timing.add(seconds)
+
+    def count(self, cache, outcome, n=1):
+        session = self._session()
+        with self._lock:
+            self.caches[cache, outcome] += n
+            run = self._runs.get(session)
+            if run is not None:
+                run.caches[f"{cache}:{outcome}"] += n
+
+    def begin(self, page):
+        session = self._session()
+        with self._lock:
+            previous = self._runs.pop(session, None)
+        # A run left open by ``st.stop`` ends with its last recorded stage.
+        if previous is not None:
+            self._finish(previous, previous.last)
+        with self._lock:
+            self._runs[session] = _Run(page)
+            self._pages[session] = page
+
+    def end(self):
+        with self._lock:
+            run = self._runs.pop(self._session(), None)
+        if run is not None:
+            self._finish(run, time.perf_counter())
+
+    def _finish(self, run, end):
+        seconds = end - run.start
+        key = (run.page, RERUN, self.versions["dataset"], self.versions["model"])
+        with self._lock:
+            timing = self.stages.get(key)
+            if timing is None:
+                timing = self.stages[key] = Timing()
+            timing.add(seconds)
+        if self.log_path:
+            self._log(run, seconds)
+
+    def _log(self, run, seconds):
+        line = json.dumps({
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "page": run.page, "seconds": round(seconds, 6),
+            "stages": {k: round(v, 6) for k, v in run.stages.items()}, "caches": dict(run.caches),
+            **self.versions,
+        })
+        try:
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
+
+    def stage_table(self):
+        """One row per page, stage and version pair, with latency quantiles in milliseconds."""
+        with self._lock:
+            items = [(key, t.count, t.total, t.max, t.first_seen, t.quantile(0.5), t.quantile(0.95))
+                     for key, t in self.stages.items()]
+        rows = [{"page": page, "stage": name, "dataset": dataset, "model": model, "count": n,
+                 "mean_ms": total / n * 1e3, "p50_ms": p50 * 1e3, "p95_ms": p95 * 1e3, "max_ms": peak * 1e3,
+                 "first_seen": first}
+                for (page, name, dataset, model), n, total, peak, first, p50, p95 in items]
+        columns = ["page", "stage", "dataset", "model", "count", "mean_ms", "p50_ms", "p95_ms", "max_ms",
+                   "first_seen"]
+        return pd.DataFrame(rows, columns=columns).sort_values(["page", "stage", "first_seen"], ignore_index=True)
+
+    def cache_table(self):
+        """Lookups per cache by outcome, with the share that did not rebuild the value."""
+        with self._lock:
+            counts = dict(self.caches)
+        table = pd.Series(counts, dtype="int64")
+        if table.empty:
+            return pd.DataFrame(columns=["hit", "miss", "hit_rate"])
+        table = table.unstack(fill_value=0)
+        for outcome in ("hit", "miss"):
+            if outcome not in table:
+                table[outcome] = 0
+        table["hit_rate"] = 1 - table["miss"] / table.sum(axis=1)
+        return table.rename_axis(index="cache", columns=None)
+
+    def prometheus_text(self):
+        """All counters in the Prometheus text exposition format."""
+        lines = [
+            "# HELP dashboard_stage_seconds Time spent in a named stage of a page rerun.",
+            "# TYPE dashboard_stage_seconds summary",
+        ]
+        for _, row in self.stage_table().iterrows():
+            labels = ",".join(f'{k}="{_escape(row[k])}"' for k in ("page", "stage", "dataset", "model"))
+            lines.append(f'dashboard_stage_seconds{{{labels},quantile="0.5"}} {row["p50_ms"] / 1e3:.6f}')
+            lines.append(f'dashboard_stage_seconds{{{labels},quantile="0.95"}} {row["p95_ms"] / 1e3:.6f}')
+            lines.append(f"dashboard_stage_seconds_sum{{{labels}}} {row['mean_ms'] * row['count'] / 1e3:.6f}")
+            lines.append(f"dashboard_stage_seconds_count{{{labels}}} {row['count']}")
+        lines += [
+            "# HELP dashboard_cache_requests_total Cache lookups by cache and outcome.",
+            "# TYPE dashboard_cache_requests_total counter",
+        ]
+        with self._lock:
+            counts = sorted(self.caches.items())
+        for (cache, outcome), n in counts:
+            lines.append(f'dashboard_cache_requests_total{{cache="{_escape(cache)}",outcome="{_escape(outcome)}"}} {n}')
+        lines += ["# HELP dashboard_info Versions of the data and model being served.",
+                  "# TYPE dashboard_info gauge",
+                  f'dashboard_info{{dataset="{_escape(self.versions["dataset"])}",'
+                  f'model="{_escape(self.versions["model"])}"}} 1']
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self.stages.clear()
+            self.caches.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def regressions(table):
+    """Per page and stage, the latest version's mean latency against the version before it.
+
+    ``table`` is a ``Metrics.stage_table``; stages seen under a single
+    version pair are left out. Sorted by slowdown, largest first.
+    """
+    rows = []
+    for (page, name), group in table.groupby(["page", "stage"], sort=False):
+        if len(group) < 2:
+            continue
+        before, after = group.iloc[-2], group.iloc[-1]
+        rows.append({"page": page, "stage": name,
+                     "from": f"{before['dataset']}/{before['model']}", "to": f"{after['dataset']}/{after['model']}",
+                     "before_ms": before["mean_ms"], "after_ms": after["mean_ms"],
+                     "change": after["mean_ms"] / before["mean_ms"] - 1 if before["mean_ms"] else float("nan")})
+    columns = ["page", "stage", "from", "to", "before_ms", "after_ms", "change"]
+    return pd.DataFrame(rows, columns=columns).sort_values("change", ascending=False, ignore_index=True)
+
+
+METRICS = Metrics(log_path=LOG_PATH)
+set_version = METRICS.set_version
+count = METRICS.count
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as stage ``name`` of the current rerun."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        METRICS.record(name, time.perf_counter() - start)
+
+
+def plotly_chart(fig, **kwargs):
+    """``st.plotly_chart``, timed as the ``plotly`` stage (figure serialization)."""
+    with stage("plotly"):
+        return st.plotly_chart(fig, **kwargs)
+
+
+def cached(name, **cache_kwargs):
+    """``st.cache_resource`` that counts hits and misses of cache ``name`` and times its builds."""
+    def decorate(fn):
+        built = threading.local()
+
+        @functools.wraps(fn)
+        def build(*args, **kwargs):
+            built.value = True
+            with stage(f"build {name}"):
+                return fn(*args, **kwargs)
+
+        shared = st.cache_resource(**cache_kwargs)(build)
+
+        @functools.wraps(fn)
+        def get(*args, **kwargs):
+            built.value = False
+            value = shared(*args, **kwargs)
+            count(name, "miss" if built.value else "hit")
+            return value
+
+        get.clear = shared.clear
+        return get
+    return decorate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@st.cache_resource(show_spinner=False)
+def start_exporter(port):
+    """Serve ``/metrics`` on ``port`` from a daemon thread, once per process.
+
+    Returns the server, or ``None`` if the port could not be bound; the
+    failure is logged once and not retried until the process restarts.
+    """
+    try:
+        server = ThreadingHTTPServer(("", int(port)), _Handler)
+    except (OSError, ValueError) as e:
+        logger.warning("could not serve metrics on port %s: %s", port, e)
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server
+
+
+def begin_page(name):
+    """Start timing a rerun of page ``name``. Call first thing in every page script."""
+    METRICS.begin(name)
+    if PORT:
+        start_exporter(PORT)
+    st.markdown(f'<style>[data-testid="stSidebarNav"] a[href$="/{DIAGNOSTICS_PAGE}"] '
+                '{display: none;}</style>', unsafe_allow_html=True)
+
+
+def end_page():
+    """Record the total time of the current rerun. Call last thing in every page script."""
+    METRICS.end()
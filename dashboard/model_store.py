@@ -0,0 +1,97 @@
+"""Uncompressed, memory-mapped copies of the trained model artifacts.
+
+The notebook saves the pipelines with ``joblib.dump(..., compress=3)``, so
+every worker process decompresses the KNN training matrix and its KD-tree
+into private memory on startup. Next to each artifact we keep an
+uncompressed copy (``<name>.mmap/``): a joblib file whose numpy arrays are
+stored as raw, aligned buffers and a ``manifest.json`` recording the
+SHA-256 of the artifact it was exported from and the scikit-learn version.
+When the manifest matches the artifact the copy is loaded with
+``mmap_mode="r"``, so workers share the buffers through the OS page cache and
+startup costs a few page faults instead of a decompression.
+Build it ahead of a deploy with::
+
+    python -m dashboard.model_store
+"""
+import argparse
+import glob
+import json
+import os
+
+import joblib
+import sklearn
+
+from dashboard.data import file_version, read_manifest
+from dashboard.files import write_atomic
+from dashboard.prediction import MODEL_PATH
+
+
+def store_dir(path=MODEL_PATH):
+    """Directory holding the memory-mappable copy of ``path``."""
+    return os.path.splitext(path)[0] + ".mmap"
+
+
+def export(model, store, source_sha256):
+    """Write ``model`` uncompressed to ``store`` with a manifest. Returns the manifest.
+
+    As with the dataset's columnar copy, the file name carries the source
+    digest and the manifest is swapped in atomically before older copies are
+    removed, so workers that still map the previous file are unaffected.
+    """
+    name = f"{source_sha256[:16]}-model.joblib"
+    write_atomic(os.path.join(store, name), lambda tmp: joblib.dump(model, tmp, compress=0))
+
+    manifest = {
+        "format": 1,
+        "source_sha256": source_sha256,
+        "file": name,
+        "class": f"{type(model).__module__}.{type(model).__qualname__}",
+        "sklearn_version": sklearn.__version__,
+        "bytes": os.path.getsize(os.path.join(store, name)),
+    }
+
+    def write_manifest(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+
+    write_atomic(os.path.join(store, "manifest.json"), write_manifest)
+
+    for stale in glob.glob(os.path.join(store, "*-model.joblib")):
+        if os.path.basename(stale) != name:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return manifest
+
+
+def convert(path=MODEL_PATH):
+    """Export the artifact at ``path`` to its memory-mappable copy. Returns the manifest."""
+    _, digest = file_version(path)
+    return export(joblib.load(path), store_dir(path), digest)
+
+
+def load_model(path=MODEL_PATH, mmap=True):
+    """Load the artifact at ``path``, through its memory-mapped copy when possible.
+
+    The copy is (re)built when missing or stale; if it cannot be written the
+    artifact itself is loaded.
+    """
+    _, digest = file_version(path)
+    store = store_dir(path)
+    manifest = read_manifest(store)
+    if manifest is None or manifest.get("source_sha256") != digest:
+        model = joblib.load(path)
+        try:
+            manifest = export(model, store, digest)
+        except OSError:
+            return model
+    return joblib.load(os.path.join(store, manifest["file"]), mmap_mode="r" if mmap else None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a trained model to its memory-mappable copy.")
+    parser.add_argument("model", nargs="?", default=MODEL_PATH)
+    args = parser.parse_args()
+    manifest = convert(args.model)
+    print(f"Wrote {manifest['bytes'] / 1e6:.1f} MB to {store_dir(args.model)}")
@@ -0,0 +1,117 @@
+"""Input normalization and chunked scoring for the survival model.
+
+The Predictive Analytics page scores either one hand-entered patient or an
+uploaded clinic list. Both go through ``normalize``, which cleans each
+categorical column by normalizing its distinct values once and mapping the
+codes back, and through ``score``, which runs one ``predict_proba`` per chunk
+and derives the label from it instead of calling ``predict`` as well.
+"""
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from dashboard.data import ROOT_DIR
+
+MODEL_PATH = os.path.join(ROOT_DIR, "jupyter-notebooks", "assets", "trained_model.joblib")
+
+MODEL_COLUMNS = ["Age", "Obesity_BMI", "Family_History", "Alcohol_Consumption", "Diet_Risk", "Screening_History"]
+
+CATEGORY_LEVELS = {
+    "Obesity_BMI": ["Normal", "Overweight", "Obese"],
+    "Family_History": ["Yes", "No"],
+    "Alcohol_Consumption": ["Yes", "No"],
+    "Diet_Risk": ["Low", "Moderate", "High"],
+    "Screening_History": ["Never", "Irregular", "Regular"],
+}
+
+CHUNK_SIZE = 10_000
+
+
+def read_table(uploaded):
+    """Read an uploaded CSV (comma or semicolon separated) or Parquet file."""
+    name = getattr(uploaded, "name", str(uploaded)).lower()
+    if name.endswith((".parquet", ".pq")):
+        return pd.read_parquet(uploaded)
+    return pd.read_csv(uploaded, sep=None, engine="python", dtype=str, keep_default_na=False)
+
+
+def _clean_levels(col, levels):
+    """Map a column onto ``levels``; blanks become NaN, anything else unknown is flagged."""
+    codes, uniques = pd.factorize(col, use_na_sentinel=True)
+    cleaned = pd.Index(uniques.astype(str)).str.strip().str.capitalize()
+    lookup = np.where(cleaned.isin(levels), cleaned, None).astype(object)
+    blank = np.append(cleaned == "", True)
+    values = np.append(lookup, None)[codes]
+    invalid = ~blank[codes] & pd.isna(values)
+    return pd.Categorical(values, categories=levels), invalid
+
+
+def normalize(df):
+    """Validated model input and a per-row description of unusable values.
+
+    Missing values are left as NaN for the pipeline's imputers; values that
+    cannot be read (non-numeric ages, unknown categories) are reported in the
+    returned ``issues`` Series, which is empty for rows that can be scored.
+    Raises ``ValueError`` if a model column is absent.
+    """
+    missing = [c for c in MODEL_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+
+    out = pd.DataFrame(index=df.index)
+    issues = pd.Series("", index=df.index, dtype=object)
+    age = df["Age"]
+    if pd.api.types.is_numeric_dtype(age):
+        unreadable = pd.Series(False, index=df.index)
+    else:
+        text = age.astype("string").str.strip().replace("", pd.NA)
+        age = pd.to_numeric(text, errors="coerce").astype(float)
+        unreadable = age.isna() & text.notna()
+    bad = unreadable | (age < 0) | (age > 120)
+    out["Age"] = age.where(~bad)
+    issues[bad.to_numpy()] += "Age; "
+    for c, levels in CATEGORY_LEVELS.items():
+        out[c], invalid = _clean_levels(df[c], levels)
+        issues[invalid] += f"{c}; "
+    return out[MODEL_COLUMNS], issues.str.rstrip("; ")
+
+
+def input_columns(output_names, columns=MODEL_COLUMNS):
+    """Input column behind each preprocessed column (e.g. Family_History_Yes -> Family_History)."""
+    return [next(c for c in columns if name == c or name.startswith(c + "_")) for name in output_names]
+
+
+def predict_proba(pipeline, X):
+    """Probability of surviving five years for each row of ``X``."""
+    proba = pipeline.predict_proba(X)
+    return proba[:, list(pipeline.classes_).index(1)]
+
+
+def score(pipeline, df, chunk_size=CHUNK_SIZE):
+    """Yield ``df`` in scored chunks with Survival_Probability and Predicted_Survival.
+
+    Rows with issues keep their original values, an empty prediction and an
+    Issues column explaining why.
+    """
+    X, issues = normalize(df)
+    for start in range(0, len(df), chunk_size):
+        stop = start + chunk_size
+        chunk = df.iloc[start:stop].copy()
+        ok = (issues.iloc[start:stop] == "").to_numpy()
+        proba = np.full(len(chunk), np.nan)
+        if ok.any():
+            proba[ok] = predict_proba(pipeline, X.iloc[start:stop][ok])
+        chunk["Survival_Probability"] = proba.round(4)
+        chunk["Predicted_Survival"] = pd.Series(np.where(proba > 0.5, "Yes", "No"), index=chunk.index).where(ok)
+        chunk["Issues"] = issues.iloc[start:stop]
+        yield chunk
+
+
+def to_csv_bytes(chunks):
+    """Concatenate scored chunks into one CSV document."""
+    buf = io.StringIO()
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(buf, index=False, header=i == 0)
+    return buf.getvalue().encode("utf-8")
@@ -0,0 +1,156 @@
+"""Streaming rebuild of the postprocessed dataset from the raw extract.
+
+The data-analysis notebook reads the whole of ``colorectal_cancer_dataset.csv``,
+drops the columns the project does not use (``DROPPED_COLUMNS``) and cleans
+the remaining ones in several full-frame passes before the dashboard's
+``postprocessed_colorectal_cancer_dataset.csv`` is written. ``preprocess`` does
+the same in one pass over fixed-size chunks, so memory stays bounded by
+``chunksize`` whatever the size of the extract:
+
+* each categorical column is factorized and only its distinct values are
+  looked up in a table of accepted spellings (``LEVELS`` plus ``ALIASES``,
+  matched case-insensitively), which maps e.g. ``" male "`` to ``M`` and
+  ``"TRUE"`` to ``Yes``; anything else is written as missing and counted;
+* numeric columns are validated and written as read. Rows without a usable
+  Patient_ID or an Age in [0, 120] are dropped, since the dashboard loads
+  both as integers;
+* the output goes to a temporary file that replaces the dataset only once
+  every chunk is written.
+
+The columnar copy used by the pages is rebuilt from the new CSV on the next
+load (or with ``python -m dashboard.data``). From the command line::
+
+    python -m dashboard.preprocess path/to/colorectal_cancer_dataset.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from dashboard import data
+from dashboard.files import write_atomic
+
+RAW_PATH = os.path.join(data.ROOT_DIR, "jupyter-notebooks", "colorectal_cancer_dataset.csv")
+
+DROPPED_COLUMNS = [
+    "Country", "Insurance_Status", "Healthcare_Costs", "Urban_or_Rural", "Economic_Classification",
+    "Healthcare_Access",
+]
+
+OUTPUT_COLUMNS = [
+    "Patient_ID", "Age", "Gender", "Cancer_Stage", "Tumor_Size_mm", "Family_History", "Smoking_History",
+    "Alcohol_Consumption", "Obesity_BMI", "Diet_Risk", "Physical_Activity", "Diabetes",
+    "Inflammatory_Bowel_Disease", "Genetic_Mutation", "Screening_History", "Early_Detection", "Treatment_Type",
+    "Survival_5_years", "Mortality", "Incidence_Rate_per_100K", "Mortality_Rate_per_100K", "Survival_Prediction",
+]
+
+LEVELS = {
+    **{c: list(data.ENCODINGS[c]) for c in data.ENCODINGS},
+    "Gender": ["M", "F"],
+    "Treatment_Type": ["Surgery", "Chemotherapy", "Radiotherapy", "Combination"],
+}
+
+ALIASES = {
+    **{c: {"Yes": ["y", "true", "1"], "No": ["n", "false", "0"]} for c in data.BINARY_COLUMNS},
+    "Gender": {"M": ["male", "man"], "F": ["female", "woman"]},
+}
+
+INTEGER_COLUMNS = ["Patient_ID", "Age"]
+AGE_RANGE = (0, 120)
+CHUNK_ROWS = 100_000
+
+
+def lookup_tables(levels=LEVELS, aliases=ALIASES):
+    """Per column, a map from a stripped, lower-cased spelling to its level."""
+    tables = {}
+    for column, names in levels.items():
+        table = {name.lower(): name for name in names}
+        for name, spellings in aliases.get(column, {}).items():
+            table.update({s.lower(): name for s in spellings})
+        tables[column] = table
+    return tables
+
+
+def _normalize(col, table):
+    """Map ``col`` through ``table`` value by distinct value; returns the levels and the unrecognised mask."""
+    codes, uniques = pd.factorize(col)
+    keys = pd.Index(uniques, dtype=object).astype(str).str.strip().str.lower()
+    mapped = np.array([table.get(k, "") for k in keys] + [""], dtype=object)
+    unknown = np.append(~keys.isin(list(table)) & (keys != ""), False)
+    return mapped[codes], unknown[codes]
+
+
+def clean_chunk(chunk, tables):
+    """Cleaned chunk (strings in ``OUTPUT_COLUMNS`` order) and counts of what was dropped or blanked."""
+    counts = {}
+    numbers = {c: pd.to_numeric(chunk[c].str.strip(), errors="coerce") for c in data.NUMERIC_DTYPES}
+    age = numbers["Age"]
+    keep = numbers["Patient_ID"].notna() & (numbers["Patient_ID"] % 1 == 0)
+    counts["dropped: Patient_ID"] = int((~keep).sum())
+    valid_age = (age % 1 == 0) & age.between(*AGE_RANGE)
+    counts["dropped: Age"] = int((keep & ~valid_age).sum())
+    keep &= valid_age
+
+    out = pd.DataFrame(index=chunk.index[keep])
+    for c in OUTPUT_COLUMNS:
+        if c in INTEGER_COLUMNS:
+            out[c] = numbers[c][keep].astype("int64").astype(str)
+        elif c in numbers:
+            text = chunk[c][keep].str.strip()
+            out[c] = text.where(numbers[c][keep].notna(), "")
+            counts[f"blanked: {c}"] = int((numbers[c][keep].isna() & (text != "")).sum())
+        else:
+            out[c], unknown = _normalize(chunk[c][keep], tables[c])
+            counts[f"blanked: {c}"] = int(unknown.sum())
+    return out, counts
+
+
+def preprocess(raw_path=RAW_PATH, out_path=data.DATA_PATH, chunksize=CHUNK_ROWS, sep=";", progress=None):
+    """Rebuild ``out_path`` from the raw extract, ``chunksize`` rows at a time.
+
+    Returns ``{"rows_read", "rows_written", ...}`` with the number of rows
+    dropped and values blanked per column. ``progress(rows_read)`` is called
+    after each chunk. Raises ``ValueError`` if an output column is missing.
+    """
+    header = pd.read_csv(raw_path, sep=sep, nrows=0).columns.str.strip()
+    missing = [c for c in OUTPUT_COLUMNS if c not in header]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+
+    tables = lookup_tables()
+    report = {"rows_read": 0, "rows_written": 0}
+
+    def write(tmp):
+        reader = pd.read_csv(raw_path, sep=sep, dtype=str, chunksize=chunksize, keep_default_na=False,
+                             usecols=lambda c: c.strip() in OUTPUT_COLUMNS)
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            f.write(sep.join(OUTPUT_COLUMNS) + "\n")
+            for chunk in reader:
+                chunk.columns = chunk.columns.str.strip()
+                cleaned, counts = clean_chunk(chunk, tables)
+                cleaned.to_csv(f, sep=sep, index=False, header=False)
+                report["rows_read"] += len(chunk)
+                report["rows_written"] += len(cleaned)
+                for key, n in counts.items():
+                    report[key] = report.get(key, 0) + n
+                if progress:
+                    progress(report["rows_read"])
+
+    write_atomic(out_path, write)
+    return {k: v for k, v in report.items() if v or k.startswith("rows")}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the postprocessed dataset from the raw extract.")
+    parser.add_argument("raw", nargs="?", default=RAW_PATH)
+    parser.add_argument("--out", default=data.DATA_PATH)
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    report = preprocess(args.raw, args.out, args.chunksize,
+                        progress=lambda n: print(f"  {n:,} rows read", end="\r"))
+    print()
+    for key, value in report.items():
+        print(f"{key}: {value:,}")
+    print(f"Wrote {args.out}")
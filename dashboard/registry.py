@@ -0,0 +1,130 @@
+"""One process-wide registry of the trained models used by the pages.
+
+The Predictive and Prescriptive pages explain the same KNN pipeline. The
+registry resolves a model name through ``jupyter-notebooks/assets/models.json``
+to its artifact file and pinned SHA-256, installs the unpickling shims once,
+verifies the checksum and loads the artifact through its memory-mapped copy
+(see ``model_store``). The resulting ``ModelHandle`` is cached per artifact
+version, so moving between pages reuses the loaded model; replacing the file
+gives a new version and a fresh handle.
+
+After retraining, update the ``sha256`` of the entry (``sha256sum <file>``)
+or remove it to skip the check.
+"""
+import json
+import os
+import threading
+import time
+
+from dashboard import metrics, model_store
+from dashboard.data import file_version
+from dashboard.prediction import CATEGORY_LEVELS, MODEL_PATH
+
+ASSETS_DIR = os.path.dirname(MODEL_PATH)
+CATALOG_PATH = os.path.join(ASSETS_DIR, "models.json")
+DEFAULT_MODEL = "final_knn_k3"
+
+_shim_lock = threading.Lock()
+_shims_installed = False
+
+
+class ChecksumError(ValueError):
+    """The artifact on disk does not match the checksum pinned in the catalog."""
+
+
+def install_shims():
+    """Make artifacts pickled with other scikit-learn releases loadable. Idempotent."""
+    global _shims_installed
+    with _shim_lock:
+        if _shims_installed:
+            return
+        import sklearn.compose._column_transformer as ct
+        if not hasattr(ct, "_RemainderColsList"):
+            class _RemainderColsList(list):
+                """Shim for backward compatibility."""
+            ct._RemainderColsList = _RemainderColsList
+        _shims_installed = True
+
+
+def read_catalog(path=CATALOG_PATH):
+    """Model entries by name: ``{"file": ..., "sha256": ..., "description": ...}``."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _unwrap(obj):
+    """Some notebook exports wrap the pipeline in a list together with metadata."""
+    if isinstance(obj, list):
+        from sklearn.pipeline import Pipeline
+        return next((x for x in obj if isinstance(x, Pipeline)), obj[0])
+    return obj
+
+
+class ModelHandle:
+    """A loaded model with its provenance."""
+
+    def __init__(self, name, path, sha256, model, description=""):
+        self.name = name
+        self.path = path
+        self.sha256 = sha256
+        self.version = sha256[:16]
+        self.model = model
+        self.description = description
+        self.loaded_at = time.time()
+        self._predictors = {}
+        self._lock = threading.Lock()
+
+    @property
+    def predictor(self):
+        """The model to score with, answering from a ``PredictionTable`` of the whole input grid.
+
+        ``FastKNN`` replaces the pipeline when ``DASHBOARD_KNN_ENGINE=fast``;
+        ``DASHBOARD_PREDICTION_TABLE=0`` scores without the table.
+        """
+        key = (os.environ.get("DASHBOARD_KNN_ENGINE") == "fast",
+               os.environ.get("DASHBOARD_PREDICTION_TABLE", "1") != "0")
+        with self._lock:
+            metrics.count("predictor", "hit" if key in self._predictors else "miss")
+            if key not in self._predictors:
+                predictor = self.model
+                with metrics.stage("build predictor"):
+                    if key[0]:
+                        from dashboard.knn import FastKNN
+                        predictor = FastKNN.from_pipeline(predictor, CATEGORY_LEVELS)
+                    if key[1]:
+                        from dashboard.lookup import PredictionTable
+                        predictor = PredictionTable(predictor)
+                self._predictors[key] = predictor
+            return self._predictors[key]
+
+
+def model_path(name=DEFAULT_MODEL, catalog=None):
+    entry = (catalog or read_catalog())[name]
+    return os.path.join(ASSETS_DIR, entry["file"])
+
+
+@metrics.cached("model", max_entries=4, show_spinner="Loading model...")
+def _load_shared(name, path, mtime_ns, digest, expected, description):
+    if expected and expected != digest:
+        raise ChecksumError(f"{os.path.basename(path)} has SHA-256 {digest[:16]}..., "
+                            f"but the catalog pins {expected[:16]}... for {name!r}")
+    install_shims()
+    return ModelHandle(name, path, digest, _unwrap(model_store.load_model(path)), description)
+
+
+def get_model(name=DEFAULT_MODEL):
+    """Return the process-wide handle for the current version of model ``name``.
+
+    Raises ``KeyError`` for unknown names, ``FileNotFoundError`` if the
+    artifact is missing and ``ChecksumError`` if it fails verification.
+    """
+    catalog = read_catalog()
+    if name not in catalog:
+        raise KeyError(f"Unknown model {name!r}; known models: {', '.join(catalog)}")
+    entry = catalog[name]
+    path = model_path(name, catalog)
+    mtime_ns, digest = file_version(path)
+    handle = _load_shared(name, path, mtime_ns, digest, entry.get("sha256"), entry.get("description", ""))
+    if name == DEFAULT_MODEL:
+        metrics.set_version("model", handle.version)
+    return handle
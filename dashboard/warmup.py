@@ -0,0 +1,112 @@
+"""Start-up warm-up and import-time report.
+
+The pages import scikit-learn and SciPy only on the code paths that use them
+(clustering, Kendall correlation, model loading, explanations), so opening a
+page does not pay for libraries it never touches. ``start_warmup`` is called
+by the start page and the Diagnostic page once per process. It starts a
+background thread that imports those libraries (``PRELOAD``) while the user
+is still reading, and then fits the likely clustering configurations (see
+``clustering.warm_up``). Set ``DASHBOARD_PRELOAD=0`` or
+``DASHBOARD_CLUSTER_WARMUP=0`` to skip either step.
+
+Run ``python -m dashboard.warmup`` to see how long each page's imports take in
+a fresh interpreter.
+"""
+import ast
+import glob
+import importlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+
+import streamlit as st
+
+from dashboard.data import ROOT_DIR
+
+logger = logging.getLogger(__name__)
+
+PRELOAD = (
+    "scipy.stats",
+    "sklearn.cluster",
+    "sklearn.compose",
+    "sklearn.decomposition",
+    "sklearn.metrics",
+    "sklearn.model_selection",
+    "sklearn.neighbors",
+    "sklearn.pipeline",
+    "sklearn.preprocessing",
+    "dashboard.clustering",
+    "dashboard.registry",
+)
+
+
+def preload(modules=PRELOAD):
+    """Import ``modules`` into the process; returns the ones that failed."""
+    failed = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            failed.append(name)
+    return failed
+
+
+def _warm_up():
+    if os.environ.get("DASHBOARD_PRELOAD", "1") != "0":
+        failed = preload()
+        if failed:
+            logger.warning("could not preload: %s", ", ".join(failed))
+    if os.environ.get("DASHBOARD_CLUSTER_WARMUP", "1") != "0":
+        from dashboard.clustering import warm_up_quietly
+        warm_up_quietly(max_workers=2)
+
+
+@st.cache_resource(show_spinner=False)
+def start_warmup():
+    """Start the background warm-up once per process. Returns its thread."""
+    thread = threading.Thread(target=_warm_up, name="dashboard-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def page_imports(path):
+    """Source of the top-level import statements of a page script."""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    tree = ast.parse(source)
+    return "\n".join(ast.get_source_segment(source, node) for node in tree.body
+                     if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+exec(compile(sys.stdin.read(), "<imports>", "exec"))
+print(json.dumps({"seconds": time.perf_counter() - start, "modules": len(sys.modules),
+                  "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+def measure(imports, cwd=ROOT_DIR):
+    """Time ``imports`` in a fresh interpreter: seconds, modules loaded and peak RSS."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [cwd, os.environ.get("PYTHONPATH")])))
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", _PROBE], input=imports, cwd=cwd, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def import_report(root=ROOT_DIR):
+    """One row per page script with the cost of its imports; ``streamlit`` alone is the baseline."""
+    pages = sorted(glob.glob(os.path.join(root, "*_Start_Page.py"))) + sorted(glob.glob(os.path.join(root, "pages", "*.py")))
+    rows = [{"page": "(streamlit only)", **measure("import streamlit", root)}]
+    rows += [{"page": os.path.relpath(p, root), **measure(page_imports(p), root)} for p in pages]
+    return rows
+
+
+if __name__ == "__main__":
+    print(f"{'page':<40} {'seconds':>8} {'modules':>8} {'peak RSS MB':>12}")
+    for row in import_report():
+        print(f"{row['page']:<40} {row['seconds']:>8.2f} {row['modules']:>8} {row['max_rss_mb']:>12.0f}")
@@ -1,6 +1,9 @@
 import streamlit as st
 
+from dashboard.metrics import begin_page, end_page
+
 st.set_page_config(page_title="About", layout="wide")
+begin_page("About")
 
 st.sidebar.image("./assets/Colorectal Cancer Logo.png")
 st.sidebar.success("Select a tab above.")
@@ -106,3 +109,5 @@ st.markdown("""
     </div>
 </div>
 """, unsafe_allow_html=True)
+
+end_page()
@@ -1,10 +1,16 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+
+from dashboard.cube import load_cube
+from dashboard.data import describe_version
+from dashboard.metrics import begin_page, end_page, plotly_chart, stage
 
 st.set_page_config(page_title="Descriptive Analytics", layout="wide")
+begin_page("Descriptive Analytics")
 st.sidebar.success("Select a tab above.")
 st.sidebar.image("./assets/Colorectal Cancer Logo.png")
+st.sidebar.caption(describe_version())
 
 st.markdown("""
     <h1 style="
@@ -27,7 +33,8 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-df = pd.read_csv("jupyter-notebooks/postprocessed_colorectal_cancer_dataset.csv", sep=";")
+with stage("load cube"):
+    cube = load_cube()
 
 question = st.selectbox(
     "Select an analysis:",
@@ -44,26 +51,27 @@ if question == "Age and Gender Distribution":
     st.subheader("Age and Gender Distribution")
     st.write("Understand the age distribution and gender composition of patients in the dataset. Use the slider to focus on specific age ranges.")
 
-    min_age = int(df["Age"].min())
-    max_age = int(df["Age"].max())
+    min_age = cube.min_age
+    max_age = cube.max_age
     age_range = st.slider("Select age range:", min_value=min_age, max_value=max_age, value=(min_age, max_age))
 
-    df_filtered = df[(df["Age"] >= age_range[0]) & (df["Age"] <= age_range[1])]
+    age_bins = cube.age_index.histogram(age_range, n_bins=20)
 
     col1, col2 = st.columns(2)
     with col1:
-        fig_age = px.histogram(df_filtered, x="Age", nbins=20, color="Gender",
-                               title="Age Distribution by Gender", opacity=0.7)
-        st.plotly_chart(fig_age, use_container_width=True)
+        fig_age = px.bar(age_bins, x="Age", y="count", color="Gender",
+                         title="Age Distribution by Gender", opacity=0.7)
+        plotly_chart(fig_age, use_container_width=True)
     with col2:
-        gender_counts = df_filtered["Gender"].value_counts()
+        gender_counts = cube.age_index.counts(age_range)
+        gender_counts = gender_counts[gender_counts > 0].sort_values(ascending=False)
         fig_gender = px.pie(values=gender_counts.values, names=gender_counts.index,
                             title="Gender Distribution (%)",
                             color_discrete_sequence=px.colors.qualitative.Set2)
-        st.plotly_chart(fig_gender, use_container_width=True)
+        plotly_chart(fig_gender, use_container_width=True)
 
     st.write("**Descriptive Stats:**")
-    st.dataframe(df_filtered.groupby("Gender")["Age"].describe().round(2))
+    st.dataframe(cube.age_index.describe(age_range).round(2))
 
 
 elif question == "Distribution of Cancer Stages":
@@ -72,12 +80,12 @@ elif question == "Distribution of Cancer Stages":
 
     selected_stage = st.radio(
         "Select a Cancer Stage:",
-        options=["All"] + sorted(df["Cancer_Stage"].unique().tolist()),
+        options=["All"] + cube.levels_present("Cancer_Stage"),
         horizontal=True
     )
 
-    df_stage = df if selected_stage == "All" else df[df["Cancer_Stage"] == selected_stage]
-    stage_counts = df_stage["Cancer_Stage"].value_counts()
+    stage_counts = cube.counts("Cancer_Stage", Cancer_Stage=None if selected_stage == "All" else selected_stage)
+    stage_counts = stage_counts[stage_counts > 0].sort_values(ascending=False)
 
     col1, col2 = st.columns(2)
     with col1:
@@ -88,7 +96,7 @@ elif question == "Distribution of Cancer Stages":
             color=stage_counts.index,
             color_discrete_sequence=px.colors.qualitative.Set2
         )
-        st.plotly_chart(fig_bar, use_container_width=True)
+        plotly_chart(fig_bar, use_container_width=True)
 
     with col2:
         fig_pie = px.pie(
@@ -96,24 +104,26 @@ elif question == "Distribution of Cancer Stages":
             title="Cancer Stage Distribution (%)",
             color_discrete_sequence=px.colors.qualitative.Set2
         )
-        st.plotly_chart(fig_pie, use_container_width=True)
+        plotly_chart(fig_pie, use_container_width=True)
 
 
 elif question == "Survivability Across Cancer Stages":
     st.subheader("Survivability Across Cancer Stages")
     st.write("Compare the 5-year survival rate across different cancer stages to understand prognosis trends.")
 
-    df["Survival_5_years"] = df["Survival_5_years"].map({"Yes": 1, "No": 0})
-    df_clean = df.dropna(subset=["Cancer_Stage", "Survival_5_years"])
+    outcomes = cube.counts(["Cancer_Stage", "Survival_5_years"]).unstack("Survival_5_years")
+    outcomes = outcomes.reindex(columns=["Yes", "No"], fill_value=0)
+    outcomes = outcomes[outcomes.sum(axis=1) > 0]
 
     selected_stage = st.radio(
         "Select a Cancer Stage:",
-        options=["All"] + sorted(df_clean["Cancer_Stage"].unique().tolist()),
+        options=["All"] + sorted(outcomes.index.tolist()),
         horizontal=True
     )
 
-    df_filtered = df_clean if selected_stage == "All" else df_clean[df_clean["Cancer_Stage"] == selected_stage]
-    surv = df_filtered.groupby("Cancer_Stage")["Survival_5_years"].mean().reset_index()
+    if selected_stage != "All":
+        outcomes = outcomes.loc[[selected_stage]]
+    surv = (outcomes["Yes"] / outcomes.sum(axis=1)).rename("Survival_5_years").reset_index()
     surv["Survival_5_years"] *= 100
 
     fig = px.bar(
@@ -122,7 +132,7 @@ elif question == "Survivability Across Cancer Stages":
         labels={"Survival_5_years": "Survival Rate (%)"},
         color_discrete_sequence=px.colors.qualitative.Set2
     )
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(fig, use_container_width=True)
     st.dataframe(surv.rename(columns={"Survival_5_years": "Survival Rate (%)"}))
 
 
@@ -130,9 +140,6 @@ elif question == "Smoking History Among Non-Survivors":
     st.subheader("Smoking History Among Non-Survivors")
     st.write("Analyze the smoking habits of patients who did not survive past 5 years. Filter by gender and cancer stage.")
 
-    df["Survival_5_years"] = df["Survival_5_years"].map({"Yes": 1, "No": 0})
-    df["Smoking_History"] = df["Smoking_History"].map({"Yes": 1, "No": 0})
-
     selected_gender = st.radio(
         "Select Gender:",
         options=["All", "M", "F"],
@@ -141,18 +148,18 @@ elif question == "Smoking History Among Non-Survivors":
     )
     selected_stage = st.radio(
         "Select Cancer Stage:",
-        options=["All"] + sorted(df["Cancer_Stage"].unique().tolist()),
+        options=["All"] + cube.levels_present("Cancer_Stage"),
         horizontal=True
     )
 
-    df_filtered = df.copy()
-    if selected_gender != "All":
-        df_filtered = df_filtered[df_filtered["Gender"] == selected_gender]
-    if selected_stage != "All":
-        df_filtered = df_filtered[df_filtered["Cancer_Stage"] == selected_stage]
-
-    non_survivors = df_filtered[df_filtered["Survival_5_years"] == 0]
-    counts = non_survivors["Smoking_History"].value_counts().rename({0: "Non-Smoker", 1: "Smoker"})
+    counts = cube.counts(
+        "Smoking_History",
+        Gender=None if selected_gender == "All" else selected_gender,
+        Cancer_Stage=None if selected_stage == "All" else selected_stage,
+        Survival_5_years="No",
+    )
+    counts = counts.reindex(["No", "Yes"], fill_value=0)
+    counts = counts[counts > 0].sort_values(ascending=False).rename({"No": "Non-Smoker", "Yes": "Smoker"})
 
     fig = px.bar(
         x=counts.index, y=counts.values, text=counts.values,
@@ -161,7 +168,7 @@ elif question == "Smoking History Among Non-Survivors":
         color=counts.index,
         color_discrete_sequence=px.colors.qualitative.Set2
     )
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(fig, use_container_width=True)
 
 
 elif question == "Tumor Size Across Stages":
@@ -170,18 +177,30 @@ elif question == "Tumor Size Across Stages":
 
     selected_stage = st.radio(
         "Select Cancer Stage:",
-        options=["All"] + sorted(df["Cancer_Stage"].unique().tolist()),
+        options=["All"] + cube.levels_present("Cancer_Stage"),
         horizontal=True
     )
 
-    df_filtered = df if selected_stage == "All" else df[df["Cancer_Stage"] == selected_stage]
-
-    fig = px.box(
-        df_filtered, x="Cancer_Stage", y="Tumor_Size_mm", color="Cancer_Stage",
-        title="Tumor Size Distribution by Cancer Stage",
-        color_discrete_sequence=px.colors.qualitative.Set2
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    stats = cube.value_stats("Cancer_Stage", Cancer_Stage=None if selected_stage == "All" else selected_stage)
+
+    # Boxes are drawn from the precomputed quartiles; whiskers follow the
+    # usual 1.5 x IQR rule, clipped to the observed range.
+    fig = go.Figure()
+    palette = px.colors.qualitative.Set2
+    for i, (level, row) in enumerate(stats.iterrows()):
+        iqr = row["75%"] - row["25%"]
+        fig.add_trace(go.Box(
+            name=level, x=[level], q1=[row["25%"]], median=[row["50%"]], q3=[row["75%"]],
+            lowerfence=[max(row["min"], row["25%"] - 1.5 * iqr)],
+            upperfence=[min(row["max"], row["75%"] + 1.5 * iqr)],
+            marker_color=palette[i % len(palette)],
+        ))
+    fig.update_layout(title="Tumor Size Distribution by Cancer Stage",
+                      xaxis_title="Cancer_Stage", yaxis_title="Tumor_Size_mm", legend_title="Cancer_Stage")
+    plotly_chart(fig, use_container_width=True)
 
     st.write("**Summary Statistics:**")
-    st.dataframe(df_filtered.groupby("Cancer_Stage")["Tumor_Size_mm"].agg(["count", "mean", "median", "std"]).round(2))
+    summary = stats[["count", "mean", "50%", "std"]].rename(columns={"50%": "median"})
+    st.dataframe(summary.round(2))
+
+end_page()
@@ -1,9 +1,13 @@
 import streamlit as st
 import pandas as pd
-import joblib
 import os
 
+from dashboard.metrics import begin_page, end_page, stage
+from dashboard.prediction import MODEL_COLUMNS, normalize, predict_proba, read_table, score, to_csv_bytes
+from dashboard.registry import get_model
+
 st.set_page_config(page_title="Predictive Analytics", layout="wide")
+begin_page("Predictive Analytics")
 st.sidebar.success("Select a tab above.")
 st.sidebar.image("./assets/Colorectal Cancer Logo.png")
 
@@ -25,63 +29,95 @@ Use the interactive options below to select features and generate survival predi
 
 
 
-@st.cache_resource
-def load_pipeline():
-    model_path = "jupyter-notebooks/assets/trained_model.joblib"
-    if not os.path.exists(model_path):
-        st.error(f"Model file not found at {model_path}")
-        st.stop()
-    return joblib.load(model_path)
-
-pipeline = load_pipeline()
-
-st.subheader("Enter patient data to predict 5-year survival:")
-
-age = st.number_input("Age", min_value=0, max_value=120, value=50)
-obesity_bmi = st.selectbox("Obesity BMI", ["Normal", "Overweight", "Obese"])
-family_history = st.selectbox("Family History", ["Yes", "No"])
-alcohol_consumption = st.selectbox("Alcohol Consumption", ["Yes", "No"])
-diet_risk = st.selectbox("Diet Risk", ["Low", "Moderate", "High"])
-screening_history = st.selectbox("Screening History", ["Never", "Irregular", "Regular"])
-
-input_df = pd.DataFrame([{
-    "Age": age,
-    "Obesity_BMI": obesity_bmi,
-    "Family_History": family_history,
-    "Alcohol_Consumption": alcohol_consumption,
-    "Diet_Risk": diet_risk,
-    "Screening_History": screening_history
-}])
-
-for c in input_df.columns:
-    input_df[c] = input_df[c].astype(str).str.strip().str.capitalize()
-
-cols_order = ["Age", "Obesity_BMI", "Family_History", "Alcohol_Consumption", "Diet_Risk", "Screening_History"]
-input_df = input_df[cols_order]
-
-if st.button("Predict 5-Year Survival"):
-    try:
-        pred = pipeline.predict(input_df)
-        proba = None
-        if hasattr(pipeline, "predict_proba"):
-            try:
-                proba = pipeline.predict_proba(input_df)[:, 1]
-            except Exception:
-                proba = None
-
-        if int(pred[0]) == 1:
-            st.success(
-                f"🟩 Predicted: Survive 5 years — Probability: {proba[0]:.2f}"
-                if proba is not None else "🟩 Predicted: Survive 5 years"
-            )
-        else:
-            st.warning(
-                f"🟥 Predicted: Not survive 5 years — Probability: {proba[0]:.2f}"
-                if proba is not None else "🟥 Predicted: Not survive 5 years"
-            )
-
-        if proba is not None:
+try:
+    with stage("load model"):
+        model = get_model()
+except Exception as e:
+    st.error(f"❌ Error loading model: {e}")
+    st.stop()
+pipeline = model.predictor
+st.caption(f"Model: {model.name} (version {model.version})")
+
+mode = st.radio("Prediction mode:", ["Single patient", "Batch (upload a file)"], horizontal=True)
+
+if mode == "Single patient":
+    st.subheader("Enter patient data to predict 5-year survival:")
+
+    age = st.number_input("Age", min_value=0, max_value=120, value=50)
+    obesity_bmi = st.selectbox("Obesity BMI", ["Normal", "Overweight", "Obese"])
+    family_history = st.selectbox("Family History", ["Yes", "No"])
+    alcohol_consumption = st.selectbox("Alcohol Consumption", ["Yes", "No"])
+    diet_risk = st.selectbox("Diet Risk", ["Low", "Moderate", "High"])
+    screening_history = st.selectbox("Screening History", ["Never", "Irregular", "Regular"])
+
+    input_df = pd.DataFrame([{
+        "Age": age,
+        "Obesity_BMI": obesity_bmi,
+        "Family_History": family_history,
+        "Alcohol_Consumption": alcohol_consumption,
+        "Diet_Risk": diet_risk,
+        "Screening_History": screening_history
+    }])
+
+    input_df, _ = normalize(input_df)
+
+    if st.button("Predict 5-Year Survival"):
+        try:
+            with stage("predict"):
+                proba = predict_proba(pipeline, input_df)
+
+            if proba[0] > 0.5:
+                st.success(f"🟩 Predicted: Survive 5 years — Probability: {proba[0]:.2f}")
+            else:
+                st.warning(f"🟥 Predicted: Not survive 5 years — Probability: {proba[0]:.2f}")
+
             st.progress(float(proba[0]))
 
-    except Exception as e:
-        st.error(f"❌ Error generating prediction: {e}")
+        except Exception as e:
+            st.error(f"❌ Error generating prediction: {e}")
+
+
+else:
+    st.subheader("Upload a patient list to predict 5-year survival:")
+    st.write(f"The file needs the columns {', '.join(MODEL_COLUMNS)}. Other columns are kept in the output.")
+
+    uploaded = st.file_uploader("Patient list (CSV or Parquet)", type=["csv", "parquet"])
+
+    if uploaded is not None:
+        try:
+            patients = read_table(uploaded)
+            normalize(patients.head(0))
+        except Exception as e:
+            st.error(f"❌ Could not read the file: {e}")
+            st.stop()
+
+        # Keep the scored file across reruns (e.g. the download click) instead of rescoring it
+        key = ("batch_predictions", uploaded.file_id)
+        if st.session_state.get("batch_key") != key:
+            progress = st.progress(0.0, text=f"Scoring {len(patients):,} patients...")
+            chunks, done = [], 0
+            with stage("batch scoring"):
+                for chunk in score(pipeline, patients):
+                    chunks.append(chunk)
+                    done += len(chunk)
+                    progress.progress(done / len(patients), text=f"Scored {done:,} of {len(patients):,} patients")
+            progress.empty()
+            st.session_state["batch_key"] = key
+            st.session_state["batch_results"] = pd.concat(chunks) if chunks else patients.head(0)
+            st.session_state["batch_csv"] = to_csv_bytes(chunks)
+
+        results = st.session_state["batch_results"]
+        n_issues = int((results["Issues"] != "").sum()) if len(results) else 0
+        st.success(f"Scored {len(results) - n_issues:,} patients.")
+        if n_issues:
+            st.warning(f"{n_issues:,} rows could not be scored; see the Issues column.")
+        st.dataframe(results.head(100))
+
+        st.download_button(
+            "Download predictions (CSV)",
+            data=st.session_state["batch_csv"],
+            file_name=f"{os.path.splitext(uploaded.name)[0]}_predictions.csv",
+            mime="text/csv"
+        )
+
+end_page()
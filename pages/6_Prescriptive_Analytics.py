@@ -1,14 +1,22 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import joblib
 import os
-import shap
-import matplotlib.pyplot as plt
+import plotly.express as px
+
+from dashboard.charts import shap_summary, shap_waterfall
+from dashboard.data import describe_version
+from dashboard.counterfactuals import recommend
+from dashboard.explain import GLOBAL_SAMPLE, get_neighbour_explainer, request_explanation, request_global_shap
+from dashboard.importance import get_job
+from dashboard.metrics import begin_page, end_page, plotly_chart, stage
+from dashboard.prediction import normalize, predict_proba
+from dashboard.registry import get_model
 
 st.set_page_config(page_title="Prescriptive Analytics", layout="wide")
+begin_page("Prescriptive Analytics")
 st.sidebar.success("Select a tab above.")
 st.sidebar.image("./assets/Colorectal Cancer Logo.png")
+st.sidebar.caption(describe_version())
 
 st.markdown("""
 <h1 style="font-size:60px; font-weight:700; text-align:center; color:#1261B5;">
@@ -24,34 +32,12 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-try:
-    import sklearn.compose._column_transformer as _ct
-    if not hasattr(_ct, "_RemainderColsList"):
-        class _RemainderColsList(list):
-            """Shim for backward compatibility."""
-            pass
-        _ct._RemainderColsList = _RemainderColsList
-except Exception as e:
-    st.warning(f"Shim injection warning: {e}")
-
-MODEL_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
-                                          "..", "jupyter-notebooks", "assets",
-                                          "final_knn_k3_pipeline.joblib"))
 FIGS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "Figs"))
-os.makedirs(FIGS_DIR, exist_ok=True)
-
-if not os.path.exists(MODEL_PATH):
-    st.error(f"❌ Model file not found at: {MODEL_PATH}")
-    st.stop()
 
 try:
-    obj = joblib.load(MODEL_PATH)
-    if isinstance(obj, list):
-        from sklearn.pipeline import Pipeline
-        pipeline = next((x for x in obj if isinstance(x, Pipeline)), obj[0])
-    else:
-        pipeline = obj
-    st.success("Pipeline loaded successfully.")
+    with stage("load model"):
+        model = get_model()
+    st.success(f"Pipeline loaded successfully (version {model.version}).")
 except Exception as e:
     st.error(f"❌ Error loading pipeline: {e}")
     st.stop()
@@ -75,23 +61,21 @@ input_df = pd.DataFrame([{
     "Screening_History": screening_history
 }])
 
-for col in ["Obesity_BMI", "Diet_Risk", "Screening_History", "Family_History", "Alcohol_Consumption"]:
-    input_df[col] = input_df[col].astype(str).str.strip().str.capitalize()
+input_df, _ = normalize(input_df)
 
 st.write("### Input data preview")
 st.dataframe(input_df)
 
 try:
-    pred = pipeline.predict(input_df)
-    proba = pipeline.predict_proba(input_df)[:, 1] if hasattr(pipeline, "predict_proba") else None
+    with stage("predict"):
+        proba = predict_proba(model.predictor, input_df)
 
-    if int(pred[0]) == 1:
-        st.success(f"🟩 Predicted: Survive 5 years" + (f" — Probability: {proba[0]:.2f}" if proba is not None else ""))
+    if proba[0] > 0.5:
+        st.success(f"🟩 Predicted: Survive 5 years — Probability: {proba[0]:.2f}")
     else:
-        st.warning(f"🟥 Predicted: Not survive 5 years" + (f" — Probability: {proba[0]:.2f}" if proba is not None else ""))
+        st.warning(f"🟥 Predicted: Not survive 5 years — Probability: {proba[0]:.2f}")
 
-    if proba is not None:
-        st.progress(float(proba[0]))
+    st.progress(float(proba[0]))
 except Exception as e:
     st.error(f"❌ Prediction failed: {e}")
     st.stop()
@@ -100,57 +84,127 @@ st.markdown("---")
 st.markdown("## Prescriptive Insights")
 
 shap_global = os.path.join(FIGS_DIR, "SHAP_global_kernel.png")
-shap_local = os.path.join(FIGS_DIR, "SHAP_local_kernel_row0.png")
-
-if not os.path.exists(shap_global) or not os.path.exists(shap_local):
-    with st.spinner("Generating SHAP explanations..."):
-        try:
-            try:
-                if hasattr(pipeline, "named_steps") and "preprocessor" in pipeline.named_steps:
-                    preprocessor = pipeline.named_steps["preprocessor"]
-                    X_transformed = preprocessor.transform(input_df)
-                    feature_names = preprocessor.get_feature_names_out()
-                else:
-                    X_transformed = pipeline[:-1].transform(input_df)
-                    feature_names = input_df.columns
-            except Exception:
-                X_transformed = pipeline.transform(input_df)
-                feature_names = input_df.columns
-
-            X_df = pd.DataFrame(np.asarray(X_transformed), columns=feature_names)
-
-            def model_predict(X):
-                clf = pipeline.named_steps[list(pipeline.named_steps.keys())[-1]]
-                return clf.predict_proba(X)[:, 1]
-
-            explainer = shap.Explainer(model_predict, X_df)
-            shap_values = explainer(X_df)
-
-            plt.figure()
-            shap.summary_plot(shap_values.values, X_df, show=False)
-            plt.title("Global SHAP Summary (Numeric Space)")
-            plt.tight_layout()
-            plt.savefig(shap_global, dpi=300)
-            plt.close()
-
-            plt.figure()
-            shap.plots.waterfall(shap_values[0], show=False)
-            plt.title("Local SHAP Explanation")
-            plt.tight_layout()
-            plt.savefig(shap_local, dpi=300)
-            plt.close()
-        except Exception as e:
-            st.info(f"Could not generate SHAP automatically: {e}")
-
-if os.path.exists(shap_global):
-    st.subheader("Global Feature Importance (SHAP)")
-    st.image(shap_global, caption="Features influencing survival across all patients", use_container_width=True)
-else:
-    st.info("Global SHAP visualization not found.")
-
-if os.path.exists(shap_local):
-    st.subheader("Local Explanation (for example patient)")
-    st.image(shap_local, caption="Most influential features for an individual case", use_container_width=True)
-else:
-    st.info("Local SHAP visualization not found.")
 
+st.subheader("Recommended Changes")
+st.write("The smallest changes to diet, alcohol, screening and BMI that raise this patient's predicted "
+         "probability of surviving 5 years.")
+any_direction = st.checkbox("Also consider changes towards less healthy levels", value=False)
+try:
+    with stage("recommend"):
+        baseline, recommendations = recommend(model.predictor, input_df, healthy_only=not any_direction)
+    if recommendations.empty:
+        st.info("No change to the modifiable features raises the predicted probability for this patient.")
+    else:
+        if recommendations["Flips prediction"].any():
+            st.success("Some of these changes flip the prediction to surviving 5 years.")
+        st.dataframe(recommendations.round(3), hide_index=True)
+except Exception as e:
+    st.info(f"Could not compute recommendations: {e}")
+
+st.subheader("Local Explanation (this patient)")
+try:
+    with stage("neighbours"):
+        neighbours = get_neighbour_explainer(model).explain(input_df)
+    n_survived = int((neighbours.neighbours["Survived 5 years"] == "Yes").sum())
+    st.write(f"The model predicts from the {len(neighbours.neighbours)} most similar patients in its training data: "
+             f"**{n_survived} of them survived 5 years**, giving a probability of {neighbours.prediction:.2f} "
+             f"(cohort average {neighbours.base_value:.2f}).")
+    st.dataframe(neighbours.neighbours.round(3))
+    st.write("How closely the neighbours match this patient, feature by feature:")
+    st.dataframe(neighbours.feature_summary(input_df.iloc[0]).round(3))
+    if neighbours.n_tied > len(neighbours.neighbours):
+        st.caption(f"{neighbours.n_tied:,} training patients are exactly as similar as the last neighbour "
+                   f"and {neighbours.tied_survival:.0%} of them survived; the model uses "
+                   f"{len(neighbours.neighbours)} of them.")
+except Exception as e:
+    st.info(f"Could not explain this prediction: {e}")
+
+if st.checkbox("Show SHAP values (model-agnostic, slower)"):
+    shap_job = request_explanation(model, input_df)
+    shap_ready = shap_job.done()
+
+    @st.fragment(run_every=1 if not shap_ready else None)
+    def show_shap():
+        if not shap_job.done():
+            st.info("Computing SHAP values in the background...")
+            return
+        if not shap_ready:
+            st.rerun()
+        if shap_job.exception() is not None:
+            st.info(f"Could not compute SHAP values: {shap_job.exception()}")
+            return
+        explanation = shap_job.result()
+        plotly_chart(shap_waterfall(explanation), use_container_width=True)
+        st.caption(f"SHAP values against the cohort average prediction of {explanation.base_value:.2f}. "
+                   "Green features raise the predicted probability of surviving 5 years, red ones lower it.")
+        with st.expander("SHAP values"):
+            st.dataframe(explanation.frame().round(4))
+
+    show_shap()
+
+st.subheader("Global Feature Importance (SHAP)")
+global_values, global_job = request_global_shap(model)
+global_pending = global_values is None and not global_job.done()
+
+
+@st.fragment(run_every=2 if global_pending else None)
+def show_global_shap():
+    values, job = request_global_shap(model)
+    if values is not None:
+        if global_pending:
+            st.rerun()
+        plotly_chart(shap_summary(values), use_container_width=True)
+        st.caption(f"SHAP values of {values['Feature'].value_counts().iloc[0]:,} randomly sampled patients; "
+                   "features are ordered by their mean absolute effect.")
+        return
+    if job.done():
+        if global_pending:
+            st.rerun()
+        st.info(f"Could not compute the global SHAP values: {job.exception()}")
+    else:
+        st.caption(f"Computing SHAP values for {GLOBAL_SAMPLE:,} patients in the background; "
+                   "the chart appears here when they are ready.")
+    if os.path.exists(shap_global):
+        st.image(shap_global, caption="Features influencing survival across all patients (notebook figure)",
+                 use_container_width=True)
+
+
+show_global_shap()
+
+st.subheader("Permutation Importance (held-out patients)")
+st.write("How much the model's ROC-AUC on the held-out test patients drops when one feature is shuffled.")
+with stage("permutation importance"):
+    importance_job = get_job(model)
+    importance = importance_job.results()
+n_done, n_total = int(importance["repeats_done"].sum()), len(importance) * importance_job.n_repeats
+
+if n_done < n_total and not importance_job.running:
+    if st.button("Resume permutation importance" if n_done else "Compute permutation importance"):
+        importance_job.start()
+
+
+@st.fragment(run_every=2 if importance_job.running else None)
+def show_importance():
+    results = importance_job.results()
+    done = int(results["repeats_done"].sum())
+    if importance_job.error is not None:
+        st.error(f"❌ Permutation importance failed: {importance_job.error}")
+    if done:
+        shown = results[results["repeats_done"] > 0].iloc[::-1].reset_index()
+        fig = px.bar(shown, x="importance_mean", y="feature", orientation="h",
+                     error_x=shown["importance_std"].fillna(0),
+                     labels={"importance_mean": "Mean drop in ROC-AUC", "feature": ""})
+        plotly_chart(fig, use_container_width=True)
+    if importance_job.running:
+        st.caption(f"Computing... {done} of {n_total} permutations scored; the chart updates as they finish.")
+    elif done < n_total:
+        st.caption(f"{done} of {n_total} permutations scored.")
+        if done > n_done:
+            st.rerun()
+    elif done > n_done:
+        st.rerun()
+
+
+show_importance()
+
+end_page()
@@ -0,0 +1,51 @@
+import streamlit as st
+
+from dashboard.metrics import METRICS, regressions
+
+st.set_page_config(page_title="Diagnostics", layout="wide")
+st.sidebar.image("./assets/Colorectal Cancer Logo.png")
+
+st.title("Diagnostics")
+st.write("Where the time of each page rerun goes, and how often the shared caches are hit, since this "
+         "server process started. Timings are kept per dataset and model version, so a stage that slowed "
+         "down after an update shows up under **Changes since the last update**.")
+
+st.caption(f"Dataset version {METRICS.versions['dataset'] or '(not loaded yet)'} · "
+           f"model version {METRICS.versions['model'] or '(not loaded yet)'}")
+
+col1, col2 = st.columns(2)
+with col1:
+    st.button("Refresh")
+with col2:
+    if st.button("Reset counters"):
+        METRICS.clear()
+
+stages = METRICS.stage_table()
+if stages.empty:
+    st.info("Nothing recorded yet; open the other pages first.")
+    st.stop()
+
+st.subheader("Changes since the last update")
+changes = regressions(stages)
+if changes.empty:
+    st.write("Every stage has been timed under a single dataset and model version so far.")
+else:
+    st.dataframe(changes.round({"before_ms": 2, "after_ms": 2, "change": 3}), hide_index=True)
+
+st.subheader("Stages")
+pages = sorted(stages["page"].unique())
+selected = st.multiselect("Pages:", pages, default=pages)
+shown = stages[stages["page"].isin(selected)].drop(columns="first_seen")
+st.dataframe(shown.round(2), hide_index=True)
+st.caption("`rerun` is the whole script run; `plotly` is the serialization of the page's charts and "
+           "`build <cache>` the time spent filling a cache on a miss.")
+
+st.subheader("Caches")
+st.dataframe(METRICS.cache_table().round(3))
+st.caption("`hit_rate` counts every lookup that did not rebuild the value; `update` means new delta "
+           "files were applied to it and `disk` that a clustering result was read from `.cache/`.")
+
+with st.expander("Prometheus text format"):
+    text = METRICS.prometheus_text()
+    st.code(text, language="text")
+    st.download_button("Download", data=text, file_name="dashboard_metrics.txt", mime="text/plain")
@@ -0,0 +1,17 @@
+import pytest
+
+from dashboard import data, registry
+from dashboard.prediction import MODEL_COLUMNS, normalize
+
+
+@pytest.fixture(scope="session")
+def model():
+    """The shipped survival pipeline."""
+    return registry.get_model().model
+
+
+@pytest.fixture(scope="session")
+def patients():
+    """A few hundred patients from the shipped dataset, as model input."""
+    X, _ = normalize(data.load_dataset()[MODEL_COLUMNS].sample(300, random_state=0))
+    return X
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard.correlation import CORRELATION_FEATURES, CorrelationEngine
+
+
+def _frame(n, seed):
+    # Small integer ranges so every column is full of ties.
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Age": rng.integers(30, 40, n),
+        "Tumor_Size_mm": rng.integers(5, 15, n).astype(float),
+        "Cancer_Stage_Encoded": rng.integers(0, 3, n),
+        "Survival_Prediction_Encoded": rng.integers(0, 2, n),
+    })
+
+
+@pytest.mark.parametrize("method", ["spearman", "pearson"])
+def test_updated_matches_pandas(method):
+    base, delta = _frame(500, seed=0), _frame(80, seed=1)
+    # The delta also brings values below and above the base's range.
+    delta.loc[0, "Age"], delta.loc[1, "Age"] = 20, 50
+    engine = CorrelationEngine(base).updated(delta)
+    expected = pd.concat([base, delta], ignore_index=True)[CORRELATION_FEATURES].corr(method)
+    pd.testing.assert_frame_equal(engine.matrix(method), expected)
+
+
+def test_updated_ranks_match_a_full_ranking():
+    base, delta = _frame(500, seed=0), _frame(80, seed=1)
+    engine = CorrelationEngine(base).updated(delta).updated(_frame(30, seed=2))
+    rebuilt = CorrelationEngine(pd.concat([base, delta, _frame(30, seed=2)], ignore_index=True))
+    np.testing.assert_array_equal(engine.ranks, rebuilt.ranks)
+    pd.testing.assert_frame_equal(engine.corr(["Tumor_Size_mm", "Age"]), rebuilt.corr(["Tumor_Size_mm", "Age"]))
@@ -0,0 +1,33 @@
+import pytest
+
+from dashboard.counterfactuals import MODIFIABLE, candidates, recommend
+from dashboard.prediction import MODEL_COLUMNS, predict_proba
+
+
+def _changed(recommendation):
+    return frozenset(part.split(":")[0] for part in recommendation.split("; "))
+
+
+@pytest.mark.parametrize("healthy_only", [True, False])
+def test_recommendations_are_minimal(model, patients, healthy_only):
+    for i in range(20):
+        patient = patients.iloc[i]
+        baseline, result = recommend(model, patient, healthy_only, max_results=100)
+        assert (result["Gain"] > 0).all()
+        changed = [_changed(r) for r in result["Recommendation"]]
+        assert [len(c) for c in changed] == result["Changes"].tolist()
+        proba = result["Survival probability"].to_numpy()
+
+        # No recommendation is dominated by another: fewer (or the same)
+        # changes reaching at least the same probability.
+        for a in range(len(result)):
+            for b in range(len(result)):
+                assert a == b or not (changed[b] <= changed[a] and proba[b] >= proba[a])
+
+        # Nor by a candidate that was left out with strictly fewer changes.
+        variants = candidates(patient, healthy_only)
+        scores = predict_proba(model, variants[MODEL_COLUMNS])
+        for k, row in variants.iterrows():
+            subset = frozenset(f for f in MODIFIABLE if str(row[f]) != str(patient[f]))
+            if scores[k] > baseline:
+                assert not any(subset < c and scores[k] >= p for c, p in zip(changed, proba))
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard.cube import DescriptiveCube
+
+
+def _frame(n=2_000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Age": rng.integers(30, 90, n).astype(float),
+        "Gender": rng.choice(["M", "F"], n),
+        "Cancer_Stage": rng.choice(["Localized", "Regional", "Metastatic"], n),
+        "Smoking_History": rng.choice(["Never", "Former", "Current"], n),
+        "Survival_5_years": rng.choice(["Yes", "No"], n),
+        "Tumor_Size_mm": rng.integers(5, 100, n).astype(float),
+    })
+    # Missing values are left out of grouped results but kept in totals.
+    df.loc[::97, "Cancer_Stage"] = np.nan
+    df.loc[::89, "Tumor_Size_mm"] = np.nan
+    return df
+
+
+def _series(counts):
+    return counts.rename(None).sort_index()
+
+
+def test_counts_match_value_counts():
+    df = _frame()
+    cube = DescriptiveCube(df)
+    assert cube.count.sum() == len(df)
+    expected = df["Cancer_Stage"].value_counts()
+    pd.testing.assert_series_equal(_series(cube.counts("Cancer_Stage")), _series(expected),
+                                   check_dtype=False, check_names=False)
+
+    subset = df[(df["Gender"] == "F") & df["Age"].between(40, 60)]
+    expected = subset.groupby(["Smoking_History", "Survival_5_years"]).size()
+    got = cube.counts(["Smoking_History", "Survival_5_years"], age_range=(40, 60), Gender="F")
+    pd.testing.assert_series_equal(_series(got), _series(expected), check_dtype=False, check_names=False)
+
+
+def test_value_stats_match_describe():
+    df = _frame()
+    cube = DescriptiveCube(df)
+    expected = df[df["Smoking_History"] == "Never"].groupby("Cancer_Stage")["Tumor_Size_mm"].describe()
+    got = cube.value_stats("Cancer_Stage", Smoking_History="Never")
+    pd.testing.assert_frame_equal(got.sort_index(), expected.sort_index(), check_dtype=False, check_names=False)
+
+
+def test_age_index_matches_pandas():
+    df = _frame()
+    index = DescriptiveCube(df).age_index
+    subset = df[df["Age"].between(45, 70)]
+
+    expected = subset.groupby("Gender")["Age"].describe()
+    pd.testing.assert_frame_equal(index.describe((45, 70)).sort_index(), expected.sort_index(),
+                                  check_dtype=False, check_names=False)
+    pd.testing.assert_series_equal(_series(index.counts((45, 70))), _series(subset["Gender"].value_counts()),
+                                   check_dtype=False, check_names=False)
+
+    hist = index.histogram((45, 70), n_bins=5)
+    for row in hist.itertuples():
+        start, _, end = row.Age.partition("-")
+        in_bin = subset["Age"].between(int(start), int(end or start)) & (subset["Gender"] == row.Gender)
+        assert row.count == in_bin.sum()
+    assert hist["count"].sum() == len(subset)
+
+
+def test_updated_matches_rebuild():
+    base, delta = _frame(), _frame(300, seed=1)
+    cube = DescriptiveCube(base).updated(delta)
+    rebuilt = DescriptiveCube(pd.concat([base, delta], ignore_index=True))
+    for name in ("count", "value_count", "value_sum", "value_sumsq", "value_hist"):
+        np.testing.assert_allclose(getattr(cube, name), getattr(rebuilt, name))
+    pd.testing.assert_frame_equal(cube.age_index.describe(), rebuilt.age_index.describe())
+
+
+@pytest.mark.parametrize("column, value", [("Age", 95.0), ("Cancer_Stage", "Unknown"), ("Tumor_Size_mm", 150.0)])
+def test_updated_rejects_rows_outside_the_axes(column, value):
+    delta = _frame(10, seed=1)
+    delta.loc[0, column] = value
+    assert DescriptiveCube(_frame()).updated(delta) is None
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from dashboard import data
+
+
+def _frame(n=50_000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "Patient_ID": np.arange(n, dtype=np.int64),
+        "Tumor_Size_mm": rng.uniform(5, 100, n),
+        "Gender": pd.Categorical(rng.choice(["M", "F"], n)),
+    })
+
+
+def test_rebuild_keeps_mapped_columns_readable(tmp_path):
+    store = str(tmp_path / "dataset.columns")
+    df = _frame()
+    manifest = data.write_columns(df, store, "a" * 64)
+    mapped = data.read_columns(store, manifest)
+    expected = mapped["Tumor_Size_mm"].to_numpy().copy()
+    files = [os.path.join(store, c["file"]) for c in manifest["columns"]]
+    inodes = [os.stat(f).st_ino for f in files]
+
+    # Another process rebuilding the same version must not truncate the
+    # files this one has mapped (this used to end in SIGBUS): each column
+    # is a new file moved into place, never the mapped one rewritten.
+    os.remove(os.path.join(store, "manifest.json"))
+    data.write_columns(df, store, "a" * 64)
+    assert all(os.stat(f).st_ino != ino for f, ino in zip(files, inodes))
+    np.testing.assert_array_equal(mapped["Tumor_Size_mm"].to_numpy(), expected)
+    assert mapped["Gender"].tolist() == df["Gender"].tolist()
+
+    # A newer version replaces the files; the old mapping stays valid too.
+    data.write_columns(df.iloc[::-1].reset_index(drop=True), store, "b" * 64)
+    np.testing.assert_array_equal(mapped["Tumor_Size_mm"].to_numpy(), expected)
+    assert not [f for f in os.listdir(store) if f.endswith(".tmp")]
+
+
+def test_matching_store_is_not_rewritten(tmp_path):
+    store = str(tmp_path / "dataset.columns")
+    manifest = data.write_columns(_frame(), store, "a" * 64)
+    path = os.path.join(store, manifest["columns"][0]["file"])
+    before = os.stat(path).st_ino, os.stat(path).st_mtime_ns
+    assert data.write_columns(_frame(), store, "a" * 64) == manifest
+    assert (os.stat(path).st_ino, os.stat(path).st_mtime_ns) == before
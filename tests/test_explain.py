@@ -0,0 +1,22 @@
+import numpy as np
+
+from dashboard.explain import SurvivalExplainer
+from dashboard.prediction import predict_proba
+
+
+def test_contributions_add_up_to_the_prediction(model, patients):
+    explainer = SurvivalExplainer(model, patients)
+    proba = predict_proba(model, patients)
+    for i in range(10):
+        explanation = explainer.explain(patients.iloc[i:i + 1])
+        assert explanation.base_value == explainer.base_value
+        np.testing.assert_allclose(explanation.prediction, proba[i], atol=1e-12)
+        np.testing.assert_allclose(explanation.base_value + explanation.values.sum(), proba[i], atol=1e-12)
+
+
+def test_shap_values_add_up_for_every_row(model, patients):
+    explainer = SurvivalExplainer(model, patients)
+    values = explainer.shap_values(patients, chunk_size=64)
+    assert list(values.columns) == explainer.features
+    np.testing.assert_allclose(explainer.base_value + values.sum(axis=1), predict_proba(model, patients),
+                               atol=1e-12)
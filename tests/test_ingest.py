@@ -0,0 +1,46 @@
+import os
+
+import pandas as pd
+
+from dashboard import data, ingest
+
+
+def _base(tmp_path, n=200):
+    """A copy of the first ``n`` patients of the shipped dataset."""
+    path = str(tmp_path / "dataset.csv")
+    with open(data.DATA_PATH, encoding="utf-8") as src, open(path, "w", encoding="utf-8") as out:
+        for _ in range(n + 1):
+            out.write(src.readline())
+    return path
+
+
+def _new_patients(tmp_path, n=30):
+    path = str(tmp_path / "new_patients.csv")
+    rows = pd.read_csv(data.DATA_PATH, sep=";", dtype=str, nrows=n)
+    rows["Patient_ID"] = [str(10**7 + i) for i in range(n)]
+    rows.to_csv(path, sep=";", index=False)
+    return path
+
+
+def _rows(path):
+    return len(pd.read_csv(path, sep=";"))
+
+
+def test_same_extract_is_ingested_once(tmp_path):
+    path, source = _base(tmp_path), _new_patients(tmp_path)
+    name, report = ingest.ingest(source, path)
+    assert name is not None and report["rows_written"] == 30
+    assert ingest.ingest(source, path)[0] is None
+    assert data.delta_names(path) == (name,)
+    assert not [f for f in os.listdir(data.delta_dir(path)) if not f.endswith(".csv")]
+    assert len(data.load_dataset(path)) == 230
+
+
+def test_compact_folds_the_deltas_into_the_base(tmp_path):
+    path, source = _base(tmp_path), _new_patients(tmp_path)
+    ingest.ingest(source, path)
+    assert ingest.compact(path) == 1
+    assert not data.delta_names(path)
+    assert not os.path.exists(data.delta_dir(path))
+    assert _rows(path) == 230
+    assert ingest.compact(path) == 0